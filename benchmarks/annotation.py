@@ -0,0 +1,99 @@
+"""
+Compare the overlap annotation with the original implementation that scanned all speaker segments per segment.
+
+Segments are synthetic: speaker turns tile the call and every transcription segment carries words of equal length,
+so the word strategy is measured on the same input.
+
+    python -m benchmarks.annotation --sizes 400:1000 2000:5000 20000:50000
+"""
+
+import time
+import argparse
+from collections import defaultdict
+from operator import itemgetter
+
+import numpy as np
+
+from unspoken.enitites.diarization import SpeakerSegment, DiarizationResult
+from unspoken.enitites.speach_to_text import SpeachToTextWord, SpeachToTextResult, SpeachToTextSegment
+from unspoken.services.annotation.annotate_transcription import annotate, annotate_words
+
+
+def _reference_annotate(stt_result: SpeachToTextResult, diarization_result: DiarizationResult) -> list[str]:
+    diarization_segments = sorted(diarization_result.segments, key=lambda segment: segment.start)
+    speakers = []
+    for segment in stt_result.segments:
+        speaker_counter = defaultdict(float)
+        for speaker_segment in diarization_segments:
+            overlap = min(segment.end, speaker_segment.end) - max(segment.start, speaker_segment.start)
+            if overlap > 0:
+                speaker_counter[speaker_segment.speaker] += overlap / (segment.end - segment.start)
+        speakers.append(max(speaker_counter.items(), key=itemgetter(1))[0] if speaker_counter else 'unknown')
+    return speakers
+
+
+def _inputs(
+    rng: np.random.Generator, stt_count: int, diarization_count: int, duration: float, words: int
+) -> tuple[SpeachToTextResult, DiarizationResult]:
+    turn_borders = np.round(np.sort(rng.uniform(0, duration, diarization_count + 1)), 3)
+    diarization = DiarizationResult(
+        segments=[
+            SpeakerSegment(
+                id=index, start=start, end=end, duration=round(end - start, 3), speaker=f'SPEAKER_{index % 3}'
+            )
+            for index, (start, end) in enumerate(zip(turn_borders[:-1], turn_borders[1:]))
+        ]
+    )
+    stt_borders = np.round(np.sort(rng.uniform(0, duration, stt_count + 1)), 3)
+    stt = SpeachToTextResult()
+    for index, (start, end) in enumerate(zip(stt_borders[:-1], stt_borders[1:])):
+        word_borders = np.round(np.linspace(start, end, words + 1), 3)
+        stt.segments.append(
+            SpeachToTextSegment(
+                id=index,
+                start=start,
+                end=end,
+                text=' '.join(['word'] * words),
+                words=[
+                    SpeachToTextWord(start=word_start, end=word_end, text=' word')
+                    for word_start, word_end in zip(word_borders[:-1], word_borders[1:])
+                ],
+            )
+        )
+    return stt, diarization
+
+
+def _measure(func, *args) -> tuple[float, object]:
+    started_at = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started_at, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '--sizes', nargs='+', default=['400:1000', '2000:5000'], help='Segment counts, stt:diarization.'
+    )
+    parser.add_argument('--duration', type=float, default=3 * 3600, help='Call duration in seconds.')
+    parser.add_argument('--words', type=int, default=12, help='Words per transcription segment.')
+    parser.add_argument('--reference-max', type=int, default=20_000_000, help='Largest n * m for the original.')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f'{"stt":>7}{"diar":>7}{"original":>10}{"overlap":>9}{"word":>8}{"same":>6}{"messages":>10}')
+    for size in args.sizes:
+        n, m = map(int, size.split(':'))
+        stt, diarization = _inputs(rng, n, m, args.duration, args.words)
+        overlap_time, overlap = _measure(annotate, stt, diarization)
+        word_time, word = _measure(annotate_words, stt, diarization)
+        if n * m <= args.reference_max:
+            reference_time, reference = _measure(_reference_annotate, stt, diarization)
+            same = str([message.speaker for message in overlap.messages] == reference)
+            original = f'{reference_time:>10.2f}'
+        else:
+            same, original = '-', f'{"-":>10}'
+        print(f'{n:>7}{m:>7}{original}{overlap_time:>9.3f}{word_time:>8.3f}{same:>6}{len(word.messages):>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Measure the real-time factor of CPU inference against the number of threads.
+
+Every thread count runs in a fresh process with the CPU profile (``cpu_compute_type``, ``cpu_threads`` intra-op
+and ``cpu_interop_threads`` inter-op threads), the same way a pool worker is configured.
+
+    python -m benchmarks.cpu_threads path/to/media.mp4 --threads 1 2 4 8
+"""
+
+import os
+import time
+import argparse
+import multiprocessing
+
+from unspoken.services.audio.converter import SAMPLE_RATE, decode_audio
+
+
+def _measure(path: str, threads: int, limit: float, results: multiprocessing.Queue) -> None:
+    from unspoken.core.device import get_compute_type, configure_torch_threads
+    from unspoken.core.model_registry import model_registry
+    from unspoken.services.ml.pyanote_diarizer import PyanoteDiarizer
+    from unspoken.services.ml.transcriber import Transcriber
+    from unspoken.settings import settings
+
+    settings.device = 'cpu'
+    settings.cpu_threads = threads
+    configure_torch_threads()
+    audio = decode_audio(path)[: int(limit * SAMPLE_RATE)]
+    with model_registry.acquire(Transcriber, settings.transcription_model) as transcriber:
+        with model_registry.acquire(PyanoteDiarizer) as diarizer:
+            # The first run allocates buffers and is not measured.
+            transcriber.transcribe(audio[: 5 * SAMPLE_RATE])
+            diarizer.diarize(audio[: 5 * SAMPLE_RATE])
+
+            started_at = time.perf_counter()
+            diarizer.diarize(audio)
+            diarization = time.perf_counter() - started_at
+            started_at = time.perf_counter()
+            transcriber.transcribe(audio)
+            transcription = time.perf_counter() - started_at
+    results.put((get_compute_type(), len(audio) / SAMPLE_RATE, diarization, transcription))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='Media file to process.')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--limit', type=float, default=120.0, help='Seconds of audio to process.')
+    args = parser.parse_args()
+
+    print(f'{"threads":>8}{"compute":>10}{"diarize RTF":>14}{"transcribe RTF":>16}{"total RTF":>12}')
+    context = multiprocessing.get_context('spawn')
+    for threads in args.threads:
+        results = context.Queue()
+        process = context.Process(target=_measure, args=(args.path, threads, args.limit, results))
+        process.start()
+        compute_type, duration, diarization, transcription = results.get()
+        process.join()
+        print(
+            f'{threads:>8}{compute_type:>10}{diarization / duration:>14.3f}{transcription / duration:>16.3f}'
+            f'{(diarization + transcription) / duration:>12.3f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
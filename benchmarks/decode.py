@@ -0,0 +1,65 @@
+"""
+Compare the streaming ffmpeg decoder with the pydub based ``convert_to_wav``.
+
+Every run happens in a fresh process, so the reported peak RSS belongs to one decoder only.
+
+    python -m benchmarks.decode path/to/media.mp4 --repeat 3
+"""
+
+import time
+import argparse
+import resource
+import multiprocessing
+
+from unspoken.services.audio.converter import decode_audio, convert_to_wav, probe_duration
+
+
+def _run_convert_to_wav(path: str) -> None:
+    with open(path, 'rb') as file:
+        convert_to_wav(file.read())
+
+
+def _run_decode_audio(path: str) -> None:
+    decode_audio(path)
+
+
+_DECODERS = {
+    'convert_to_wav': _run_convert_to_wav,
+    'decode_audio': _run_decode_audio,
+}
+
+
+def _measure(name: str, path: str, results: multiprocessing.Queue) -> None:
+    started_at = time.perf_counter()
+    _DECODERS[name](path)
+    elapsed = time.perf_counter() - started_at
+    # ru_maxrss is reported in kilobytes on Linux.
+    results.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='Media file to decode.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per decoder, the best one is reported.')
+    args = parser.parse_args()
+
+    duration = probe_duration(args.path)
+    print(f'{args.path}: {duration or 0:.1f} s')
+    print(f'{"decoder":<16}{"seconds":>10}{"x realtime":>12}{"peak RSS, MiB":>16}')
+
+    context = multiprocessing.get_context('spawn')
+    for name in _DECODERS:
+        runs = []
+        for _ in range(args.repeat):
+            results = context.Queue()
+            process = context.Process(target=_measure, args=(name, args.path, results))
+            process.start()
+            runs.append(results.get())
+            process.join()
+        elapsed, peak_rss = min(runs)
+        speed = duration / elapsed if duration else 0
+        print(f'{name:<16}{elapsed:>10.2f}{speed:>12.1f}{peak_rss:>16.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Measure how much the single-speaker check saves on diarization.
+
+Every file is diarized with the check turned off and on. On single-speaker audio the check skips embeddings and
+clustering, on audio with several speakers it shows the cost of the extra look at the segmentation.
+
+    python -m benchmarks.diarization dictation.m4a interview.mp4 --repeat 3
+"""
+
+import time
+import argparse
+
+from unspoken.core.model_registry import model_registry
+from unspoken.enitites.diarization import SpeakerHints
+from unspoken.services.audio.converter import SAMPLE_RATE, decode_audio
+from unspoken.services.ml.pyanote_diarizer import PyanoteDiarizer
+from unspoken.settings import settings
+
+
+def _measure(diarizer: PyanoteDiarizer, audio, check: bool, hints: SpeakerHints, repeat: int) -> tuple[float, int]:
+    settings.diarization_single_speaker_check = check
+    runs = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        result = diarizer.diarize(audio, hints)
+        runs.append(time.perf_counter() - started_at)
+    return min(runs), len(result.speakers)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='Media files to diarize.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per file and mode, the best one is reported.')
+    parser.add_argument('--max-speakers', type=int, default=None, help='Passed to the diarizer as a hint.')
+    args = parser.parse_args()
+    hints = SpeakerHints(max_speakers=args.max_speakers)
+
+    with model_registry.acquire(PyanoteDiarizer) as diarizer:
+        # The first run allocates buffers and is not measured.
+        diarizer.diarize(decode_audio(args.paths[0])[: 10 * SAMPLE_RATE])
+        print(f'{"file":<32}{"seconds":>9}{"full":>9}{"checked":>9}{"saved":>8}{"speakers":>10}')
+        for path in args.paths:
+            audio = decode_audio(path)
+            duration = len(audio) / SAMPLE_RATE
+            full, _ = _measure(diarizer, audio, False, hints, args.repeat)
+            checked, speakers = _measure(diarizer, audio, True, hints, args.repeat)
+            print(
+                f'{path[-32:]:<32}{duration:>9.1f}{full:>9.2f}{checked:>9.2f}{1 - checked / full:>8.0%}{speakers:>10}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Compare the DTW used by ``annotate_dtw`` with the original pure Python implementation.
+
+Segments are synthetic: speaker turns tile the call, transcription segments end at some of the turn borders,
+shifted by up to a second, the way Whisper segments usually follow pauses between speakers.
+The original implementation is only run up to ``--reference-max`` matrix cells, it takes minutes on long calls.
+
+    python -m benchmarks.dtw --sizes 400:1000 2000:5000 --band 60
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from unspoken.services.annotation.annotate_transcription import dtw
+
+
+def _reference_dtw(seq1: list[tuple[float, float]], seq2: list[tuple[float, float]]) -> list[tuple[int, int]]:
+    n, m = len(seq1), len(seq2)
+    dtw_matrix = np.zeros((n + 1, m + 1))
+    dtw_matrix[0, 1:] = np.inf
+    dtw_matrix[1:, 0] = np.inf
+
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            cost = abs(seq1[i - 1][0] - seq2[j - 1][0]) + abs(seq1[i - 1][1] - seq2[j - 1][1])
+            dtw_matrix[i, j] = cost + min(dtw_matrix[i - 1, j], dtw_matrix[i, j - 1], dtw_matrix[i - 1, j - 1])
+
+    i, j = n, m
+    path = [(i - 1, j - 1)]
+    while i > 1 and j > 1:
+        if dtw_matrix[i - 1, j - 1] == min(dtw_matrix[i - 1, j - 1], dtw_matrix[i - 1, j], dtw_matrix[i, j - 1]):
+            i, j = i - 1, j - 1
+        elif dtw_matrix[i - 1, j] == min(dtw_matrix[i - 1, j - 1], dtw_matrix[i - 1, j], dtw_matrix[i, j - 1]):
+            i -= 1
+        else:
+            j -= 1
+        path.append((i - 1, j - 1))
+    return path[::-1]
+
+
+def _intervals(borders: np.ndarray) -> list[tuple[float, float]]:
+    return [(round(float(start), 3), round(float(end), 3)) for start, end in zip(borders[:-1], borders[1:])]
+
+
+def _segments(
+    rng: np.random.Generator, stt_count: int, diarization_count: int, duration: float
+) -> tuple[list[tuple[float, float]], list[tuple[float, float]]]:
+    turn_borders = np.sort(rng.uniform(0, duration, diarization_count + 1))
+    chosen = np.sort(rng.choice(np.arange(1, diarization_count), stt_count - 1, replace=False))
+    inner = turn_borders[chosen] + rng.uniform(-1.0, 1.0, stt_count - 1)
+    stt_borders = np.sort(np.concatenate([turn_borders[:1], inner, turn_borders[-1:]]))
+    return _intervals(stt_borders), _intervals(turn_borders)
+
+
+def _measure(func, *args, **kwargs) -> tuple[float, list[tuple[int, int]]]:
+    started_at = time.perf_counter()
+    path = func(*args, **kwargs)
+    return time.perf_counter() - started_at, path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '--sizes', nargs='+', default=['400:1000', '2000:5000'], help='Segment counts, stt:diarization.'
+    )
+    parser.add_argument('--duration', type=float, default=3 * 3600, help='Call duration in seconds.')
+    parser.add_argument('--band', type=float, default=60.0, help='Band width in seconds.')
+    parser.add_argument('--reference-max', type=int, default=2_000_000, help='Largest matrix for the original.')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(
+        f'{"stt":>6}{"diar":>6}{"original":>10}{"full":>8}{"banded":>8}'
+        f'{"full MiB":>10}{"band MiB":>10}{"full ok":>9}{"band ok":>9}'
+    )
+    for size in args.sizes:
+        n, m = map(int, size.split(':'))
+        seq1, seq2 = _segments(rng, n, m, args.duration)
+        full_time, full_path = _measure(dtw, seq1, seq2)
+        band_time, band_path = _measure(dtw, seq1, seq2, band=args.band)
+        # Band width in cells, the banded matrix keeps that many columns per row.
+        width = max(
+            int(np.searchsorted([s for s, _ in seq2], end + args.band, side='right'))
+            - int(np.searchsorted([e for _, e in seq2], start - args.band))
+            for start, end in seq1
+        )
+        full_mib = (n + 1) * m * 8 / 2**20
+        band_mib = (n + 1) * width * 8 / 2**20
+        if (n + 1) * (m + 1) <= args.reference_max:
+            reference_time, reference_path = _measure(_reference_dtw, seq1, seq2)
+            full_ok, band_ok = str(full_path == reference_path), str(band_path == reference_path)
+            reference = f'{reference_time:>10.2f}'
+        else:
+            full_ok, band_ok = '-', str(band_path == full_path)
+            reference = f'{"-":>10}'
+        print(
+            f'{n:>6}{m:>6}{reference}{full_time:>8.2f}{band_time:>8.2f}'
+            f'{full_mib:>10.1f}{band_mib:>10.1f}{full_ok:>9}{band_ok:>9}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare the real-time factor of the transcription modes and decoding presets on one file.
+
+The real-time factor is processing time divided by audio duration, lower is better.
+
+    python -m benchmarks.transcription path/to/media.mp4 --batch-size 8 16 --preset fast balanced accurate
+
+Run it once per ``--model`` to compare model sizes.
+"""
+
+import time
+import argparse
+
+from unspoken.core.model_registry import model_registry
+from unspoken.enitites.enums.decoding_preset import DecodingPreset
+from unspoken.enitites.enums.transcription_mode import TranscriptionMode
+from unspoken.enitites.enums.transcription_model import TranscriptionModel
+from unspoken.services.audio.converter import SAMPLE_RATE, decode_audio
+from unspoken.services.ml.transcriber import Transcriber
+from unspoken.settings import settings
+
+
+def _measure(audio, mode: TranscriptionMode, batch_size: int, preset: DecodingPreset) -> tuple[float, int]:
+    settings.transcription_mode = mode
+    settings.transcription_batch_size = batch_size
+    with model_registry.acquire(Transcriber, settings.transcription_model) as transcriber:
+        started_at = time.perf_counter()
+        result = transcriber.transcribe(audio, preset=preset)
+        return time.perf_counter() - started_at, len(result.segments)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='Media file to transcribe.')
+    parser.add_argument('--model', type=TranscriptionModel, default=settings.transcription_model)
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[settings.transcription_batch_size])
+    parser.add_argument(
+        '--preset',
+        type=DecodingPreset,
+        nargs='+',
+        default=[DecodingPreset.accurate],
+        help='Presets to run in sequential mode, the batched runs use accurate.',
+    )
+    args = parser.parse_args()
+    settings.transcription_model = args.model
+
+    audio = decode_audio(args.path)
+    duration = len(audio) / SAMPLE_RATE
+    print(f'{args.path}: {duration:.1f} s, {args.model.value}')
+
+    # Load the model and warm up the device before measuring.
+    _measure(audio[: 30 * SAMPLE_RATE], TranscriptionMode.sequential, 1, DecodingPreset.accurate)
+
+    # The first run is the baseline for the gain column.
+    runs = [(TranscriptionMode.sequential, 1, preset) for preset in args.preset]
+    runs += [(TranscriptionMode.batched, size, DecodingPreset.accurate) for size in args.batch_size]
+    print(f'{"mode":<12}{"preset":<10}{"batch":>6}{"seconds":>10}{"RTF":>8}{"gain":>8}{"segments":>10}')
+    baseline = None
+    for mode, batch_size, preset in runs:
+        elapsed, segments = _measure(audio, mode, batch_size, preset)
+        baseline = baseline or elapsed
+        print(
+            f'{mode.value:<12}{preset.value:<10}{batch_size:>6}{elapsed:>10.1f}{elapsed / duration:>8.3f}'
+            f'{baseline / elapsed:>7.2f}x{segments:>10}'
+        )
+
+
+if __name__ == '__main__':
+    main()
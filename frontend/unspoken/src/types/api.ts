@@ -5,6 +5,7 @@ export enum TaskStatus {
     processing = 'processing',
     completed = 'completed',
     failed = 'failed',
+    cancelled = 'cancelled',
 }
 
 
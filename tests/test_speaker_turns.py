@@ -0,0 +1,33 @@
+from unspoken.enitites.diarization import SpeakerSegment
+from unspoken.services.annotation.speaker_turns import merge_speaker_turns
+
+
+def _segment(id_: int, start: float, end: float, speaker: str) -> SpeakerSegment:
+    return SpeakerSegment(id=id_, start=start, end=end, duration=end - start, speaker=speaker)
+
+
+def _spans(turns: list[SpeakerSegment]) -> list[tuple[float, float, str]]:
+    return [(turn.start, turn.end, turn.speaker) for turn in turns]
+
+
+def test_overlap_goes_to_the_dominant_speaker():
+    segments = [_segment(0, 0, 10, 'A'), _segment(1, 5, 8, 'B'), _segment(2, 8, 12, 'A')]
+
+    turns = merge_speaker_turns(segments, max_duration=30, max_gap=1)
+
+    assert _spans(turns) == [(0, 12, 'A')]
+
+
+def test_interleaved_overlaps_do_not_repeat_audio():
+    segments = [_segment(0, 0, 4, 'A'), _segment(1, 3, 9, 'B'), _segment(2, 8, 10, 'A')]
+
+    turns = merge_speaker_turns(segments, max_duration=30, max_gap=1)
+
+    assert _spans(turns) == [(0, 3, 'A'), (3, 9, 'B'), (9, 10, 'A')]
+    assert all(previous.end <= turn.start for previous, turn in zip(turns, turns[1:]))
+
+
+def test_long_turns_are_cut():
+    turns = merge_speaker_turns([_segment(0, 0, 25, 'A')], max_duration=10, max_gap=1)
+
+    assert _spans(turns) == [(0, 10, 'A'), (10, 20, 'A'), (20, 25, 'A')]
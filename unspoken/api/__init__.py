@@ -1,3 +1,5 @@
+from .health import health_router
+from .live import live_router
 from .messages import messages_router
 from .speakers import speakers_router
 from .tasks import tasks_router
@@ -5,6 +7,8 @@ from .tasks_v2 import tasks_router as tasks_router_v2
 from .upload import upload_router
 
 __all__ = [
+    'health_router',
+    'live_router',
     'messages_router',
     'speakers_router',
     'tasks_router',
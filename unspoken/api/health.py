@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from unspoken.core.readiness import is_ready
+from unspoken.enitites.api.health import HealthResponse
+
+health_router = APIRouter(
+    prefix='/health',
+    tags=['Health'],
+)
+
+
+@health_router.get('/live')
+def live() -> HealthResponse:
+    return HealthResponse(status='alive')
+
+
+@health_router.get('/ready', responses={503: {'model': HealthResponse}})
+def ready() -> HealthResponse:
+    """Ready once every worker has loaded and warmed up its models."""
+    if not is_ready():
+        return JSONResponse(status_code=503, content=HealthResponse(status='starting').model_dump())
+    return HealthResponse(status='ready')
@@ -0,0 +1,92 @@
+import json
+import logging
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+
+from unspoken.enitites.api.live import LiveSegmentEvent, LiveCompletedEvent
+from unspoken.enitites.enums.live_audio_format import LiveAudioFormat
+from unspoken.services.audio.converter import SAMPLE_RATE, PcmDecoder, StreamDecoder
+from unspoken.services.ml.pipelines.live_flow import LiveTranscription
+
+live_router = APIRouter(
+    prefix='/live',
+    tags=['Live'],
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _make_decoder(audio_format: LiveAudioFormat, sample_rate: int) -> PcmDecoder | StreamDecoder:
+    if audio_format == LiveAudioFormat.opus:
+        return StreamDecoder()
+    if sample_rate == SAMPLE_RATE:
+        return PcmDecoder()
+    return StreamDecoder(input_args=['-f', 's16le', '-ar', str(sample_rate), '-ac', '1'])
+
+
+async def _send_events(websocket: WebSocket, events: list[LiveSegmentEvent | LiveCompletedEvent]) -> None:
+    for event in events:
+        await websocket.send_json(event.model_dump())
+
+
+async def _fail(
+    websocket: WebSocket,
+    decoder: PcmDecoder | StreamDecoder,
+    session: LiveTranscription,
+    connected: bool,
+) -> None:
+    """Mark the task of a broken session as failed, to be called from an exception handler."""
+    logger.exception('Live transcription for task %s failed.', session.task_id)
+    await run_in_threadpool(decoder.close)
+    await run_in_threadpool(session.fail)
+    if connected:
+        await websocket.close(code=1011)
+
+
+@live_router.websocket('')
+async def live_transcription(
+    websocket: WebSocket,
+    audio_format: LiveAudioFormat = LiveAudioFormat.pcm,
+    sample_rate: int = SAMPLE_RATE,
+    name: str | None = None,
+):
+    """
+    Transcribe a live audio stream.
+
+    The client sends binary messages with 16-bit little-endian mono PCM (``audio_format=pcm``, at
+    ``sample_rate``) or an Ogg / WebM Opus stream (``audio_format=opus``), and a ``{"type": "stop"}`` text
+    message or a close frame at the end. The server answers with ``interim`` and ``final`` segments while
+    audio arrives and with a ``completed`` message carrying the id of the stored task.
+    """
+    await websocket.accept()
+    decoder = await run_in_threadpool(_make_decoder, audio_format, sample_rate)
+    session = await run_in_threadpool(LiveTranscription, name)
+    connected = True
+    try:
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                connected = False
+                break
+            if message.get('bytes'):
+                samples = await run_in_threadpool(decoder.feed, message['bytes'])
+                await _send_events(websocket, await run_in_threadpool(session.feed, samples))
+            elif message.get('text') and json.loads(message['text']).get('type') == 'stop':
+                break
+    except WebSocketDisconnect:
+        connected = False
+    except Exception:
+        await _fail(websocket, decoder, session, connected)
+        return
+
+    # The recording is stored even when the client went away without saying stop.
+    try:
+        events = await run_in_threadpool(session.feed, await run_in_threadpool(decoder.close))
+        events += await run_in_threadpool(session.finish)
+    except Exception:
+        await _fail(websocket, decoder, session, connected)
+        return
+    if connected:
+        await _send_events(websocket, [*events, LiveCompletedEvent(task_id=session.task_id)])
+        await websocket.close()
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+from typing import AsyncIterator
+
+from fastapi import Request, APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 
 from unspoken.enitites.api.messages import MessageResponse
 from unspoken.enitites.api.speakers import SpeakerResponse
-from unspoken.enitites.api.tasks import TaskResponseV2
+from unspoken.enitites.api.tasks import TaskEvent, TaskResponseV2
 from unspoken.enitites.enums.task_status import TaskStatus
 from unspoken.services import db
+from unspoken.services.task_events import broker
+from unspoken.services.task_queue import estimate_task
+from unspoken.settings import settings
 
 tasks_router = APIRouter(
     prefix='/tasks',
@@ -12,6 +20,73 @@ tasks_router = APIRouter(
 )
 
 
+@tasks_router.delete('/{task_id:int}/')
+def cancel_task(task_id: int) -> TaskResponseV2:
+    task = db.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail='Task not found.')
+    if task.status not in (TaskStatus.queued, TaskStatus.processing):
+        raise HTTPException(status_code=409, detail=f'Task in status {task.status.value} can not be cancelled.')
+
+    temp_file_id = db.cancel_task(task_id)
+    if temp_file_id is not None:
+        temp_file = db.get_temp_file(temp_file_id)
+        if temp_file:
+            temp_file.delete()
+    return get_task_messages(task_id)
+
+
+_FINAL_STATUSES = (TaskStatus.completed, TaskStatus.failed, TaskStatus.cancelled)
+
+
+def _read_task_event(task_id: int) -> TaskEvent | None:
+    state = db.get_task_state(task_id)
+    if state is None:
+        return None
+    return TaskEvent(task_id=state.id, status=state.status, stage=state.stage, progress=state.progress)
+
+
+async def _stream_task_events(request: Request, task_id: int, queue: asyncio.Queue) -> AsyncIterator[str]:
+    try:
+        event = await run_in_threadpool(_read_task_event, task_id)
+        while event is not None:
+            yield f'event: task\ndata: {event.model_dump_json()}\n\n'
+            if event.status in _FINAL_STATUSES:
+                break
+            event = None
+            while event is None:
+                if await request.is_disconnected():
+                    return
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=settings.task_events_keepalive_interval)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if payload is None:
+                    event = await run_in_threadpool(_read_task_event, task_id)
+                else:
+                    event = TaskEvent.model_validate(payload)
+    finally:
+        broker.unsubscribe(task_id, queue)
+
+
+@tasks_router.get('/{task_id:int}/events')
+async def get_task_events(task_id: int, request: Request) -> StreamingResponse:
+    """
+    Stream status, stage and progress changes of a task as server-sent events until it reaches a final status.
+    """
+    # Subscribe before reading the current state, so no change between the two is lost.
+    queue = broker.subscribe(task_id)
+    if await run_in_threadpool(db.get_task_state, task_id) is None:
+        broker.unsubscribe(task_id, queue)
+        raise HTTPException(status_code=404, detail='Task not found.')
+    return StreamingResponse(
+        _stream_task_events(request, task_id, queue),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 @tasks_router.get('/{task_id:int}/')
 def get_task_messages(task_id: int) -> TaskResponseV2:
     task = db.get_task(task_id)
@@ -24,7 +99,25 @@ def get_task_messages(task_id: int) -> TaskResponseV2:
         file_name=task.uploaded_file_name,
         created_at=task.created_at,
         updated_at=task.updated_at,
+        duration=task.duration,
+        stage=task.stage,
+        progress=task.progress,
+        preset=task.preset,
+        model=task.model,
+        num_speakers=task.num_speakers,
+        min_speakers=task.min_speakers,
+        max_speakers=task.max_speakers,
     )
+    if task.status in (TaskStatus.queued, TaskStatus.processing):
+        estimate = estimate_task(task_id)
+        response.queue_position = estimate.position
+        response.eta_seconds = estimate.eta_seconds
+    if task.status == TaskStatus.processing:
+        # Partial transcript saved so far, it is replaced by the complete one when processing finishes.
+        messages = db.get_task_messages(task_id)
+        response.messages = [MessageResponse.model_validate(m) for m in sorted(messages, key=lambda x: x.start_time)]
+        response.speakers = [SpeakerResponse.model_validate(s) for s in db.get_task_speakers(task_id)]
+        return response
     if task.status != TaskStatus.completed:
         return response
 
@@ -1,15 +1,28 @@
+import os
+import re
 import uuid
+import asyncio
 import logging
+import weakref
+from typing import BinaryIO
 
 import magic
-from fastapi import APIRouter, UploadFile, HTTPException
+from fastapi import Form, Header, Request, APIRouter, UploadFile, HTTPException
+from starlette.requests import ClientDisconnect
+from fastapi.concurrency import run_in_threadpool
 
+from unspoken.core.loader import get_enabled_models
 from unspoken.services import db
 
-from unspoken.enitites.api.upload import UploadResponse
+from unspoken.enitites.diarization import SpeakerHints
+from unspoken.enitites.api.upload import UploadResponse, UploadSessionResponse, CreateUploadSessionRequest
 
+from unspoken.enitites.enums.decoding_preset import DecodingPreset
 from unspoken.enitites.enums.mime_types import MimeType
-from unspoken.services.task_queue import add_task
+from unspoken.enitites.enums.transcription_model import TranscriptionModel
+from unspoken.services.audio.converter import probe_duration
+from unspoken.services.task_queue import add_task, is_queue_full
+from unspoken.settings import settings
 
 
 upload_router = APIRouter(
@@ -19,18 +32,258 @@ upload_router = APIRouter(
 
 logger = logging.getLogger(__name__)
 
+_CONTENT_RANGE_PATTERN = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+# Held while a chunk of the session is written, a lock lives as long as a request uses it.
+_session_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+
+
+def _check_admission(incoming_size: int = 0) -> None:
+    if is_queue_full(incoming_size):
+        raise HTTPException(
+            status_code=429,
+            detail='Too many files are waiting for processing, try again later.',
+            headers={'Retry-After': str(settings.admission_retry_after)},
+        )
+
+
+def _check_model(model: TranscriptionModel | None) -> TranscriptionModel:
+    model = model or settings.transcription_model
+    if model not in get_enabled_models():
+        raise HTTPException(status_code=400, detail=f'Model {model.value} is not enabled.')
+    return model
+
+
+def _check_speaker_hints(hints: SpeakerHints) -> SpeakerHints:
+    if hints.min_speakers and hints.max_speakers and hints.min_speakers > hints.max_speakers:
+        raise HTTPException(status_code=400, detail='min_speakers must not be greater than max_speakers.')
+    return hints
+
+
+async def _stream_to_temp_file(file: UploadFile, temp_file: db.TempFile, first_chunk: bytes) -> int:
+    size = 0
+    chunk = first_chunk
+    with temp_file.open('wb') as f:
+        while chunk:
+            size += len(chunk)
+            if size > settings.max_upload_size:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f'File is too large, maximum allowed size is {settings.max_upload_size} bytes.',
+                )
+            await run_in_threadpool(f.write, chunk)
+            chunk = await file.read(settings.upload_chunk_size)
+    return size
+
 
 @upload_router.post('/media')
-async def upload_audio(file: UploadFile) -> UploadResponse:
-    file_data = await file.read()
-    file_type = magic.from_buffer(file_data[:2048], mime=True)
+async def upload_audio(
+    file: UploadFile,
+    preset: DecodingPreset = Form(DecodingPreset.accurate),
+    model: TranscriptionModel | None = Form(None),
+    num_speakers: int | None = Form(None, ge=1),
+    min_speakers: int | None = Form(None, ge=1),
+    max_speakers: int | None = Form(None, ge=1),
+) -> UploadResponse:
+    """
+    Upload a media file for transcription.
+
+    ``num_speakers`` fixes the number of speakers when it is known, otherwise ``min_speakers`` and ``max_speakers``
+    bound it.
+    """
+    model = _check_model(model)
+    hints = _check_speaker_hints(
+        SpeakerHints(num_speakers=num_speakers, min_speakers=min_speakers, max_speakers=max_speakers)
+    )
+    await run_in_threadpool(_check_admission, file.size or 0)
+    first_chunk = await file.read(settings.upload_chunk_size)
+    file_type = magic.from_buffer(first_chunk[:2048], mime=True)
     if not MimeType(file_type).is_supported():
         raise HTTPException(status_code=400, detail=f'File format {file_type} is not supported.')
     temp_file = db.save_temp_file(db.TempFile(file_name=str(uuid.uuid4()), file_type=MimeType(file_type)))
-    temp_file.write(file_data)
-    task = db.create_new_task(uploaded_file_name=file.filename)
+    try:
+        size = await _stream_to_temp_file(file, temp_file, first_chunk)
+    except BaseException:
+        temp_file.delete()
+        raise
+    logger.info('Stored upload %s (%s bytes) as temp file %s', file.filename, size, temp_file.id)
+    duration = await run_in_threadpool(probe_duration, temp_file.path)
+    task = db.create_new_task(
+        uploaded_file_name=file.filename,
+        duration=duration,
+        preset=preset,
+        model=model,
+        **hints.model_dump(),
+    )
+    logger.info('Publishing task %s', task.id)
+    add_task(temp_file.id, task.id, size=size, duration=duration, model=model)
+    return UploadResponse(
+        task_id=task.id,
+        task_status=task.status,
+    )
+
+
+def _parse_content_range(content_range: str) -> tuple[int, int, int]:
+    match = _CONTENT_RANGE_PATTERN.match(content_range.strip())
+    if not match:
+        raise HTTPException(status_code=400, detail=f'Invalid Content-Range header {content_range}.')
+    start, end, total = map(int, match.groups())
+    if start > end or end >= total:
+        raise HTTPException(status_code=400, detail=f'Invalid Content-Range header {content_range}.')
+    return start, end, total
+
+
+def _get_upload_session(session_id: str) -> db.UploadSession:
+    upload_session = db.get_upload_session(session_id)
+    if not upload_session:
+        raise HTTPException(status_code=404, detail='Upload session not found.')
+    return upload_session
+
+
+def _session_lock(session_id: str) -> asyncio.Lock:
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = _session_locks[session_id] = asyncio.Lock()
+    return lock
+
+
+def _open_at(temp_file: db.TempFile, offset: int) -> BinaryIO:
+    f = temp_file.open('r+b')
+    f.seek(offset)
+    return f
+
+
+def _sync_and_close(f: BinaryIO) -> None:
+    with f:
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _session_response(upload_session: db.UploadSession, offset: int | None = None) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        session_id=upload_session.id,
+        offset=upload_session.offset if offset is None else offset,
+        size=upload_session.size,
+    )
+
+
+@upload_router.post('/sessions')
+def create_upload_session(request: CreateUploadSessionRequest) -> UploadSessionResponse:
+    if request.size <= 0:
+        raise HTTPException(status_code=400, detail='File size must be positive.')
+    if request.size > settings.max_upload_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f'File is too large, maximum allowed size is {settings.max_upload_size} bytes.',
+        )
+    model = _check_model(request.model)
+    hints = _check_speaker_hints(
+        SpeakerHints(
+            num_speakers=request.num_speakers,
+            min_speakers=request.min_speakers,
+            max_speakers=request.max_speakers,
+        )
+    )
+    _check_admission(request.size)
+    upload_session = db.create_upload_session(
+        uploaded_file_name=request.file_name,
+        size=request.size,
+        preset=request.preset,
+        model=model,
+        **hints.model_dump(),
+    )
+    logger.info('Created upload session %s for %s (%s bytes)', upload_session.id, request.file_name, request.size)
+    return _session_response(upload_session)
+
+
+@upload_router.get('/sessions/{session_id}')
+def get_upload_session(session_id: str) -> UploadSessionResponse:
+    return _session_response(_get_upload_session(session_id))
+
+
+@upload_router.put('/sessions/{session_id}')
+async def upload_session_chunk(
+    session_id: str,
+    request: Request,
+    content_range: str = Header(),
+) -> UploadSessionResponse:
+    start, end, total = _parse_content_range(content_range)
+    # One chunk of a session is written at a time, so a concurrent request can not write over the bytes of this
+    # one. No transaction is open while the body arrives, the offset is committed with a conditional update.
+    lock = _session_lock(session_id)
+    if lock.locked():
+        raise HTTPException(status_code=409, detail='Another chunk of the upload session is being written.')
+    async with lock:
+        upload_session = await run_in_threadpool(_get_upload_session, session_id)
+        if total != upload_session.size:
+            raise HTTPException(status_code=400, detail='Content-Range total does not match upload session size.')
+        if start != upload_session.offset:
+            raise HTTPException(
+                status_code=409,
+                detail=f'Chunk must start at committed offset {upload_session.offset}.',
+                headers={'Upload-Offset': str(upload_session.offset)},
+            )
+
+        expected = end - start + 1
+        written = 0
+        disconnected = False
+        f = await run_in_threadpool(_open_at, upload_session.temp_file, start)
+        try:
+            async for chunk in request.stream():
+                if written + len(chunk) > expected:
+                    raise HTTPException(status_code=400, detail='Chunk is larger than Content-Range.')
+                await run_in_threadpool(f.write, chunk)
+                written += len(chunk)
+        except ClientDisconnect:
+            disconnected = True
+        finally:
+            await run_in_threadpool(_sync_and_close, f)
+        if written and not await run_in_threadpool(db.advance_upload_session, session_id, start, start + written):
+            raise HTTPException(status_code=409, detail='Upload session was modified concurrently.')
+
+    if disconnected:
+        logger.info('Client disconnected from upload session %s at offset %s', session_id, start + written)
+    return _session_response(upload_session, offset=start + written)
+
+
+@upload_router.post('/sessions/{session_id}/finalize')
+def finalize_upload_session(session_id: str) -> UploadResponse:
+    upload_session = _get_upload_session(session_id)
+    if upload_session.offset != upload_session.size:
+        raise HTTPException(
+            status_code=409,
+            detail=f'Upload is incomplete, {upload_session.offset} of {upload_session.size} bytes received.',
+            headers={'Upload-Offset': str(upload_session.offset)},
+        )
+    with upload_session.temp_file.open('rb') as f:
+        file_type = magic.from_buffer(f.read(2048), mime=True)
+    supported = MimeType(file_type).is_supported()
+    if supported:
+        model = _check_model(upload_session.model)
+    uploaded_file_name, size = upload_session.uploaded_file_name, upload_session.size
+    preset = upload_session.preset or DecodingPreset.accurate
+    hints = SpeakerHints(
+        num_speakers=upload_session.num_speakers,
+        min_speakers=upload_session.min_speakers,
+        max_speakers=upload_session.max_speakers,
+    )
+    # Of concurrent finalize calls only the one that removes the session queues the file.
+    temp_file = db.close_upload_session(session_id, file_type=MimeType(file_type) if supported else None)
+    if temp_file is None:
+        raise HTTPException(status_code=409, detail='Upload session was finalized by another request.')
+    if not supported:
+        temp_file.delete()
+        raise HTTPException(status_code=400, detail=f'File format {file_type} is not supported.')
+    duration = probe_duration(temp_file.path)
+    task = db.create_new_task(
+        uploaded_file_name=uploaded_file_name,
+        duration=duration,
+        preset=preset,
+        model=model,
+        **hints.model_dump(),
+    )
     logger.info('Publishing task %s', task.id)
-    add_task(temp_file.id, task.id)
+    add_task(temp_file.id, task.id, size=size, duration=duration, model=model)
     return UploadResponse(
         task_id=task.id,
         task_status=task.status,
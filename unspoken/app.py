@@ -1,16 +1,37 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
-from unspoken.api import messages_router, speakers_router, tasks_router, tasks_router_v2, upload_router
+from unspoken.api import (
+    health_router,
+    live_router,
+    messages_router,
+    speakers_router,
+    tasks_router,
+    tasks_router_v2,
+    upload_router,
+)
+from unspoken.core.device import configure_torch_threads
+from unspoken.core.readiness import clear_readiness_checks
+from unspoken.services import db
 from unspoken.services.db.base import setup as db_setup
-from unspoken.services.ml.pipelines.transcribe_flow import transcribe_audio_flow
+from unspoken.services.ml.pipelines.live_flow import start_live_warm_up
+from unspoken.services.ml.pipelines.transcribe_flow import (
+    transcribe_audio_flow,
+    build_transcribe_executor,
+    resident_models,
+    warm_up_models,
+)
+from unspoken.services.task_events import broker as task_events_broker
 from unspoken.services.task_queue import start_worker, stop_worker
+from unspoken.services.worker_pool import get_worker_specs, start_worker_pool
 from unspoken.settings import settings
 
 logging.basicConfig(
@@ -20,18 +41,40 @@ logger = logging.getLogger('uvicorn')
 
 
 worker_thread = None
+worker_pool = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     _init_db()
     _init_temp_file_dir()
-    global worker_thread
-    worker_thread = start_worker(transcribe_audio_flow)
+    global worker_thread, worker_pool
+    process_func = build_transcribe_executor() if settings.pipeline_enabled else transcribe_audio_flow
+    worker_specs = get_worker_specs()
+    if worker_specs:
+        worker_pool = start_worker_pool(
+            process_func,
+            worker_specs,
+            warm_up=warm_up_models,
+            resident_models=resident_models,
+        )
+    else:
+        configure_torch_threads()
+        worker_thread = start_worker(process_func, warm_up=warm_up_models, resident_models=resident_models)
+    if settings.live_enabled:
+        start_live_warm_up()
+    gc_task = asyncio.create_task(_collect_upload_sessions())
+    task_events_broker.start()
     yield
+    clear_readiness_checks()
+    task_events_broker.stop()
+    gc_task.cancel()
     stop_worker()
     if worker_thread:
         worker_thread.join()
+    if worker_pool:
+        worker_pool.stop()
+        worker_pool.join()
 
 
 app = FastAPI(debug=True, title='Unspoken', lifespan=lifespan)
@@ -50,6 +93,9 @@ app.include_router(upload_router, prefix='/api')
 app.include_router(tasks_router_v2, prefix='/api')
 app.include_router(messages_router, prefix='/api')
 app.include_router(speakers_router, prefix='/api')
+if settings.live_enabled:
+    app.include_router(live_router, prefix='/api')
+app.include_router(health_router, prefix='/api')
 
 app.mount("/assets", StaticFiles(directory=Path(settings.frontend_build_path) / "assets"), name="static")
 
@@ -69,6 +115,17 @@ def _init_temp_file_dir():
     logger.info('Initializing temp files directory finished')
 
 
+async def _collect_upload_sessions():
+    while True:
+        try:
+            deleted = await run_in_threadpool(db.delete_expired_upload_sessions, settings.upload_session_ttl)
+            if deleted:
+                logger.info('Deleted %s abandoned upload sessions', deleted)
+        except Exception:
+            logger.exception('Failed to delete abandoned upload sessions')
+        await asyncio.sleep(settings.upload_session_gc_interval)
+
+
 def _init_db():
     logger.info('Initializing database')
     db_setup()
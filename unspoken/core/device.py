@@ -1,11 +1,46 @@
+import os
+import logging
+
 import torch
 
 from unspoken.settings import settings
 
+logger = logging.getLogger(__name__)
+
 
 def get_device() -> torch.device:
-    if torch.cuda.is_available():
+    if settings.device != 'cpu' and torch.cuda.is_available():
         device = torch.device(f'{settings.device}:{settings.device_index}')
     else:
         device = torch.device('cpu')
     return device
+
+
+def is_cuda() -> bool:
+    return get_device().type == 'cuda'
+
+
+def get_compute_type() -> str:
+    """Compute type for CTranslate2, ``cpu_compute_type`` replaces ``auto`` when running on CPU."""
+    if settings.compute_type == 'auto' and not is_cuda():
+        return settings.cpu_compute_type
+    return settings.compute_type
+
+
+def get_cpu_threads() -> int:
+    return settings.cpu_threads or os.cpu_count() or 1
+
+
+def configure_torch_threads() -> None:
+    """
+    Limit torch to ``cpu_threads`` intra-op and ``cpu_interop_threads`` inter-op threads.
+
+    Should be called before the first model runs, torch refuses to change the inter-op thread count afterwards.
+    """
+    if is_cuda():
+        return
+    torch.set_num_threads(get_cpu_threads())
+    try:
+        torch.set_num_interop_threads(settings.cpu_interop_threads)
+    except RuntimeError:
+        logger.warning('Inter-op thread count is already fixed at %s.', torch.get_num_interop_threads())
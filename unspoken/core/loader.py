@@ -1,16 +1,20 @@
 import dataclasses
 import json
 import logging
+import re
 from pathlib import Path
 
 from huggingface_hub import snapshot_download
 
 from unspoken.enitites.enums.ml_models import Model
+from unspoken.enitites.enums.transcription_model import TranscriptionModel
 from unspoken.exceptions import ModelNotFound, UnspokenException
 from unspoken.settings import settings
 
 logger = logging.getLogger(__name__)
 
+_COMMIT_HASH_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+
 
 @dataclasses.dataclass
 class _ModelInfo:
@@ -25,10 +29,13 @@ def _get_model_info(model_name: str) -> _ModelInfo:
             models = json.load(f)
             if model_name not in models:
                 raise ModelNotFound(f'Model info for model {model_name} not found.')
-            model_info = models[model_name]
-            return _ModelInfo(name=model_name, **model_info)
+            model_info = _ModelInfo(name=model_name, **models[model_name])
     except json.JSONDecodeError as e:
         raise UnspokenException('Unable to read model_lock file.') from e
+    # A branch or tag may move, only a commit pins the weights.
+    if not _COMMIT_HASH_PATTERN.match(model_info.revision):
+        raise UnspokenException(f'Model {model_name} is not pinned to a commit, revision is {model_info.revision}.')
+    return model_info
 
 
 def load_model(model: Model):
@@ -48,6 +55,14 @@ def load_model(model: Model):
     logger.info(f'Model {model.value} downloaded.')
 
 
+def get_enabled_models() -> list[TranscriptionModel]:
+    """Transcription models tasks may choose from, ``transcription_model`` is always one of them."""
+    models = [settings.transcription_model]
+    models += [model for model in settings.transcription_models if model not in models]
+    return models
+
+
 def prepare_models():
-    for model in Model:
-        load_model(model)
+    load_model(Model.diarization)
+    for model in get_enabled_models():
+        load_model(Model(model.value))
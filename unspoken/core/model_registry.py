@@ -0,0 +1,157 @@
+import gc
+import os
+import time
+import logging
+import resource
+import threading
+import contextlib
+import dataclasses
+from typing import Any, TypeVar, Hashable, Iterator
+
+import torch
+
+from unspoken.core.device import is_cuda, get_device
+from unspoken.settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+def _memory_in_use() -> int:
+    """Resident memory of the process plus memory allocated by torch on the model device, in bytes."""
+    try:
+        with open('/proc/self/statm') as file:
+            memory = int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # Peak instead of current usage, still good enough to see the growth caused by a model.
+        memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    if is_cuda():
+        memory += torch.cuda.memory_allocated(get_device())
+    return memory
+
+
+def _name(key: tuple[type, tuple]) -> str:
+    cls, args = key
+    return f'{cls.__name__}({", ".join(map(str, args))})'
+
+
+@dataclasses.dataclass
+class _Entry:
+    instance: Any = None
+    size: int = 0
+    users: int = 0
+    last_used: float = 0.0
+
+
+class ModelRegistry:
+    """
+    Keeps loaded models shared between the threads of a process.
+
+    A model is built once per key under a lock and stays loaded while it is used. Its size is the ``memory_size``
+    the model reports, or the growth of process memory while it is built for models that do not. Once the total
+    size exceeds ``models_memory_budget``, models nobody uses at the moment are unloaded, least recently used first.
+    """
+
+    def __init__(self, memory_budget: int | None = None):
+        """
+        :param memory_budget: Memory available to models in bytes, 0 means unlimited.
+            ``models_memory_budget`` is used when not set.
+        """
+        self._memory_budget = memory_budget
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._entries: dict[Hashable, _Entry] = {}
+        # Sizes of unloaded models, used to free memory before they are built again.
+        self._sizes: dict[Hashable, int] = {}
+
+    @property
+    def memory_budget(self) -> int:
+        return settings.models_memory_budget if self._memory_budget is None else self._memory_budget
+
+    @property
+    def memory_used(self) -> int:
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def loaded(self) -> list[Hashable]:
+        with self._lock:
+            return [key for key, entry in self._entries.items() if entry.instance is not None]
+
+    def _evict(self, reserve: int = 0) -> list[Any]:
+        """Detach least recently used idle models until the rest fits the budget, must hold ``_lock``."""
+        budget = self.memory_budget
+        if not budget:
+            return []
+        used = sum(entry.size for entry in self._entries.values())
+        idle = sorted(
+            (key for key, entry in self._entries.items() if not entry.users and entry.instance is not None),
+            key=lambda key: self._entries[key].last_used,
+        )
+        evicted = []
+        for key in idle:
+            if used + reserve <= budget:
+                break
+            entry = self._entries.pop(key)
+            used -= entry.size
+            self._sizes[key] = entry.size
+            evicted.append(entry.instance)
+            logger.info('Unloading model %s, %.0f MiB.', _name(key), entry.size / 2**20)
+        return evicted
+
+    @staticmethod
+    def _release(instances: list[Any]) -> None:
+        if not instances:
+            return
+        instances.clear()
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def _build(self, key: Hashable, entry: _Entry, cls: type, args: tuple) -> None:
+        with self._build_lock:
+            if entry.instance is not None:
+                return
+            with self._lock:
+                evicted = self._evict(reserve=self._sizes.get(key, 0))
+            self._release(evicted)
+            start_time = time.time()
+            before = _memory_in_use()
+            instance = cls(*args)
+            size = getattr(instance, 'memory_size', None)
+            if size is None:
+                size = max(0, _memory_in_use() - before)
+            with self._lock:
+                entry.instance = instance
+                entry.size = size
+            logger.info(
+                'Loaded model %s in %.3f seconds, %.0f MiB.', _name(key), time.time() - start_time, size / 2**20
+            )
+
+    @contextlib.contextmanager
+    def acquire(self, cls: type[T], *args: Hashable) -> Iterator[T]:
+        """
+        Use the instance of ``cls`` built with ``args``, building it first when it is not loaded.
+
+        The instance is not unloaded until the block exits.
+        """
+        key = (cls, args)
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+            entry.users += 1
+        try:
+            if entry.instance is None:
+                self._build(key, entry, cls, args)
+            yield entry.instance
+        finally:
+            with self._lock:
+                entry.users -= 1
+                entry.last_used = time.monotonic()
+                if entry.instance is None and not entry.users and self._entries.get(key) is entry:
+                    # The build failed, the next user tries again.
+                    del self._entries[key]
+                evicted = self._evict()
+            self._release(evicted)
+
+
+model_registry = ModelRegistry()
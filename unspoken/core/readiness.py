@@ -0,0 +1,22 @@
+import threading
+from typing import Callable
+
+_lock = threading.Lock()
+_checks: list[Callable[[], bool]] = []
+
+
+def add_readiness_check(check: Callable[[], bool]) -> None:
+    """Register a check that has to pass before the service reports ready, e.g. ``Event.is_set`` of a worker."""
+    with _lock:
+        _checks.append(check)
+
+
+def clear_readiness_checks() -> None:
+    with _lock:
+        _checks.clear()
+
+
+def is_ready() -> bool:
+    with _lock:
+        checks = list(_checks)
+    return bool(checks) and all(check() for check in checks)
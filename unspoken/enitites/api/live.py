@@ -0,0 +1,16 @@
+from typing import Literal
+
+from pydantic import BaseModel
+
+
+class LiveSegmentEvent(BaseModel):
+    type: Literal['interim', 'final']
+    start: float
+    end: float
+    text: str
+    speaker: str | None = None
+
+
+class LiveCompletedEvent(BaseModel):
+    type: Literal['completed'] = 'completed'
+    task_id: int
@@ -4,7 +4,10 @@ from pydantic import BaseModel, Field
 
 from unspoken.enitites.api.messages import MessageResponse
 from unspoken.enitites.api.speakers import SpeakerResponse
+from unspoken.enitites.enums.decoding_preset import DecodingPreset
+from unspoken.enitites.enums.task_stage import TaskStage
 from unspoken.enitites.enums.task_status import TaskStatus
+from unspoken.enitites.enums.transcription_model import TranscriptionModel
 from unspoken.enitites.transcription import TranscriptionSegment
 
 
@@ -24,3 +27,20 @@ class TaskResponseV2(BaseModel):
     speakers: list[SpeakerResponse] = Field(default_factory=list)
     created_at: datetime.datetime
     updated_at: datetime.datetime
+    duration: float | None = None
+    queue_position: int | None = None
+    eta_seconds: float | None = None
+    stage: TaskStage | None = None
+    progress: float | None = None
+    preset: DecodingPreset | None = None
+    model: TranscriptionModel | None = None
+    num_speakers: int | None = None
+    min_speakers: int | None = None
+    max_speakers: int | None = None
+
+
+class TaskEvent(BaseModel):
+    task_id: int
+    status: TaskStatus
+    stage: TaskStage | None = None
+    progress: float | None = None
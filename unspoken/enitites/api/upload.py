@@ -1,8 +1,26 @@
-from pydantic import BaseModel
+from pydantic import Field, BaseModel
 
+from unspoken.enitites.enums.decoding_preset import DecodingPreset
 from unspoken.enitites.enums.task_status import TaskStatus
+from unspoken.enitites.enums.transcription_model import TranscriptionModel
 
 
 class UploadResponse(BaseModel):
     task_id: int
     task_status: TaskStatus
+
+
+class CreateUploadSessionRequest(BaseModel):
+    file_name: str
+    size: int
+    preset: DecodingPreset = DecodingPreset.accurate
+    model: TranscriptionModel | None = None
+    num_speakers: int | None = Field(default=None, ge=1)
+    min_speakers: int | None = Field(default=None, ge=1)
+    max_speakers: int | None = Field(default=None, ge=1)
+
+
+class UploadSessionResponse(BaseModel):
+    session_id: str
+    offset: int
+    size: int
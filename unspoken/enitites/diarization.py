@@ -9,6 +9,12 @@ class SpeakerSegment(BaseModel):
     speaker: str
 
 
+class SpeakerHints(BaseModel):
+    num_speakers: int | None = None
+    min_speakers: int | None = None
+    max_speakers: int | None = None
+
+
 class DiarizationResult(BaseModel):
     segments: list[SpeakerSegment] = Field(default_factory=list)
     speakers: list[str] = Field(default_factory=list)
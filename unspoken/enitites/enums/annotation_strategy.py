@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class AnnotationStrategy(str, Enum):
+    dtw = 'dtw'
+    overlap = 'overlap'
+    word = 'word'
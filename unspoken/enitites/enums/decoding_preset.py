@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class DecodingPreset(str, Enum):
+    fast = 'fast'
+    balanced = 'balanced'
+    accurate = 'accurate'
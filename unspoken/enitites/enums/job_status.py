@@ -0,0 +1,9 @@
+from enum import Enum
+
+
+class JobStatus(str, Enum):
+    queued = 'queued'
+    running = 'running'
+    completed = 'completed'
+    failed = 'failed'
+    cancelled = 'cancelled'
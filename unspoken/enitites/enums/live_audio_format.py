@@ -0,0 +1,6 @@
+from enum import Enum
+
+
+class LiveAudioFormat(str, Enum):
+    pcm = 'pcm'
+    opus = 'opus'
@@ -1,4 +1,5 @@
 from enum import Enum
+from pathlib import Path
 
 from unspoken.settings import settings
 
@@ -9,3 +10,7 @@ class Model(Enum):
 
     def path(self) -> str:
         return f'{settings.models_dir_path}/{self.value}'
+
+    def size(self) -> int:
+        """Size of the model files in bytes, close to the memory its weights take once loaded."""
+        return sum(path.stat().st_size for path in Path(self.path()).rglob('*') if path.is_file())
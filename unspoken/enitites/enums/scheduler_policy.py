@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class SchedulerPolicy(str, Enum):
+    fifo = 'fifo'
+    shortest_first = 'shortest_first'
+    lanes = 'lanes'
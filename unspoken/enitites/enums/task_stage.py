@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class TaskStage(str, Enum):
+    converting = 'converting'
+    diarizing = 'diarizing'
+    transcribing = 'transcribing'
+    saving = 'saving'
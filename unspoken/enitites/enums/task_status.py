@@ -6,6 +6,7 @@ class TaskStatus(str, Enum):
     processing = 'processing'
     completed = 'completed'
     failed = 'failed'
+    cancelled = 'cancelled'
     unknown = None
 
     @classmethod
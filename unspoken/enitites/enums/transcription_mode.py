@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class TranscriptionMode(str, Enum):
+    sequential = 'sequential'
+    batched = 'batched'
+    turns = 'turns'
@@ -0,0 +1,5 @@
+from enum import Enum
+
+
+class TranscriptionModel(str, Enum):
+    large_v3 = 'large-v3'
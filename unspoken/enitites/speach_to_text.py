@@ -1,11 +1,19 @@
 from pydantic import BaseModel, Field
 
 
+class SpeachToTextWord(BaseModel):
+    start: float
+    end: float
+    text: str
+
+
 class SpeachToTextSegment(BaseModel):
     id: int
     start: float
     end: float
     text: str
+    # Only filled when the decoding preset asks for word timestamps.
+    words: list[SpeachToTextWord] = Field(default_factory=list)
 
 
 class SpeachToTextResult(BaseModel):
@@ -6,6 +6,10 @@ class EncodingError(UnspokenException):
     """Raised when an encoding error occurs."""
 
 
+class DecodingError(UnspokenException):
+    """Raised when media can not be decoded into a waveform."""
+
+
 class TranscriptNotFound(UnspokenException):
     """Raised when a transcript cannot be found."""
 
@@ -18,5 +22,9 @@ class TaskNotFoundError(UnspokenException):
     """Raised when a task cannot be found."""
 
 
+class TaskCancelledError(UnspokenException):
+    """Raised when a task was cancelled while it was being processed."""
+
+
 class ModelNotFound(UnspokenException):
     """Raises when unable to find model info."""
@@ -1,5 +1,6 @@
 import logging
 from collections import defaultdict
+from itertools import groupby
 from operator import itemgetter
 
 from unspoken.enitites.diarization import DiarizationResult, SpeakerSegment
@@ -11,35 +12,6 @@ from typing import List, Tuple
 logger = logging.getLogger(__name__)
 
 
-def _determine_speaker_by_time(start: float, end: float, segments: list[SpeakerSegment]) -> str:
-    """
-    Determine the speaker based on the start and end timestamps and the given segments.
-
-    :param start: The start timestamp.
-    :param end: The end timestamp.
-    :param segments: A list of SpeakerSegment objects.
-    :return: The speaker ID or 'unknown' if no speaker is found.
-    """
-    speaker_counter = defaultdict(float)
-    total_duration = end - start
-    for segment in segments:
-        # Calculate overlap between transcription segment and speaker segment
-        overlap_start = max(start, segment.start)
-        overlap_end = min(end, segment.end)
-        if overlap_start < overlap_end:  # There is an overlap
-            overlap_duration = overlap_end - overlap_start
-            speaker_counter[segment.speaker] += overlap_duration / total_duration
-
-    if not speaker_counter:
-        logger.info('No speaker speaking')
-        return 'unknown'
-
-    logger.debug('Speaker counter now %s', speaker_counter)
-    speaker = max(speaker_counter.items(), key=itemgetter(1))[0]
-    logger.debug('Speaker %s speaking', speaker)
-    return speaker
-
-
 def _determine_speaker_by_hit_count(start: float, end: float, segments: list[SpeakerSegment]) -> str:
     """
     Determine the speaker based on the start and end timestamps and the given segments.
@@ -66,94 +38,264 @@ def _determine_speaker_by_hit_count(start: float, end: float, segments: list[Spe
     return speaker
 
 
+class _SpeakerIndex:
+    """
+    Diarization segments prepared for joining with many time intervals at once.
+
+    Segments are sorted by start. They may overlap, so the running maximum of their ends is kept as well: all
+    segments that end after a time lie at or after the first position where that maximum exceeds it.
+    """
+
+    def __init__(self, segments: list[SpeakerSegment]):
+        segments = sorted(segments, key=lambda segment: segment.start)
+        self.speakers = list(dict.fromkeys(segment.speaker for segment in segments))
+        codes = {speaker: code for code, speaker in enumerate(self.speakers)}
+        self._starts = np.array([segment.start for segment in segments], dtype=np.float64)
+        self._ends = np.array([segment.end for segment in segments], dtype=np.float64)
+        self._max_ends = np.maximum.accumulate(self._ends) if segments else self._ends
+        self._codes = np.array([codes[segment.speaker] for segment in segments], dtype=np.int64)
+
+    def speakers_of(self, starts: list[float], ends: list[float]) -> list[str]:
+        """
+        Find the speaker who talks the longest during every interval.
+
+        Every interval is only compared with the segments between two binary searches, so the join takes
+        O((n + m) log m) plus the number of overlapping pairs instead of O(n * m).
+
+        :param starts: Starts of the intervals.
+        :param ends: Ends of the intervals.
+        :return: Speaker of every interval, 'unknown' when nobody talks during it.
+        """
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        if not self.speakers:
+            return ['unknown'] * len(starts)
+        first = np.searchsorted(self._max_ends, starts, side='right')
+        last = np.searchsorted(self._starts, ends, side='left')
+        counts = np.maximum(last - first, 0)
+
+        # One row per (interval, candidate segment) pair.
+        intervals = np.repeat(np.arange(len(starts)), counts)
+        candidates = np.repeat(first, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        overlaps = np.minimum(ends[intervals], self._ends[candidates]) - np.maximum(
+            starts[intervals], self._starts[candidates]
+        )
+        overlapping = overlaps > 0
+        pairs = (intervals[overlapping], self._codes[candidates[overlapping]])
+        totals = np.zeros((len(starts), len(self.speakers)))
+        np.add.at(totals, pairs, overlaps[overlapping])
+        # Ties go to the speaker whose overlapping segment starts first.
+        first_segments = np.full(totals.shape, len(self._starts))
+        np.minimum.at(first_segments, pairs, candidates[overlapping])
+
+        longest = totals == totals.max(axis=1, keepdims=True)
+        best = np.where(longest, first_segments, len(self._starts)).argmin(axis=1)
+        found = totals[np.arange(len(starts)), best] > 0
+        if not found.all():
+            logger.info('No speaker speaking in %s of %s intervals', int((~found).sum()), len(starts))
+        return [self.speakers[code] if speaking else 'unknown' for code, speaking in zip(best, found)]
+
+
 def annotate(stt_result: SpeachToTextResult, diarization_result: DiarizationResult) -> TranscriptionResult:
     """
     Annotate the speech-to-text result with speaker information from the diarization result.
 
+    Every segment gets the speaker who talks the longest during it.
+
     :param stt_result: The SpeachToTextResult object containing the speech-to-text segments.
     :param diarization_result: The DiarizationResult object containing the speaker diarization segments.
     :return: A TranscriptionResult object with annotated speaker information.
     """
-    result = TranscriptionResult()
     stt_segments = stt_result.segments
-    diarization_segments = diarization_result.segments
+    speakers = _SpeakerIndex(diarization_result.segments).speakers_of(
+        [segment.start for segment in stt_segments],
+        [segment.end for segment in stt_segments],
+    )
+    return TranscriptionResult(
+        messages=[
+            TranscriptionSegment(speaker=speaker, start=segment.start, end=segment.end, text=segment.text)
+            for segment, speaker in zip(stt_segments, speakers)
+        ]
+    )
+
+
+def annotate_words(stt_result: SpeachToTextResult, diarization_result: DiarizationResult) -> TranscriptionResult:
+    """
+    Annotate every word and split segments where the speaker changes inside of them.
+
+    Segments without word timestamps are annotated as a whole, like ``annotate`` does. Words during which nobody
+    talks get the speaker of the word before them, or of the first word with a speaker at the segment start.
+
+    :param stt_result: The SpeachToTextResult object containing the speech-to-text segments.
+    :param diarization_result: The DiarizationResult object containing the speaker diarization segments.
+    :return: A TranscriptionResult object with a message per speaker turn within every segment.
+    """
+    index = _SpeakerIndex(diarization_result.segments)
+    stt_segments = stt_result.segments
+    segment_speakers = index.speakers_of(
+        [segment.start for segment in stt_segments],
+        [segment.end for segment in stt_segments],
+    )
+    words = [word for segment in stt_segments for word in segment.words]
+    word_speakers = iter(index.speakers_of([word.start for word in words], [word.end for word in words]))
 
-    # Sort diarization segments by start time for efficient searching
-    sorted_diarization_segments = sorted(diarization_segments, key=lambda x: x.start)
+    result = TranscriptionResult()
+    for segment, segment_speaker in zip(stt_segments, segment_speakers):
+        speakers = [next(word_speakers) for _ in segment.words]
+        known = [speaker for speaker in speakers if speaker != 'unknown']
+        previous = known[0] if known else segment_speaker
+        for position, speaker in enumerate(speakers):
+            if speaker == 'unknown':
+                speakers[position] = previous
+            else:
+                previous = speaker
 
-    for segment in stt_segments:
-        # Find relevant diarization segments for this STT segment
-        relevant_segments = [
-            s for s in sorted_diarization_segments
-            if s.start < segment.end and s.end > segment.start
+        turns = [
+            (speaker, [word for word, _ in turn])
+            for speaker, turn in groupby(zip(segment.words, speakers), key=itemgetter(1))
         ]
-        
-        speaker = _determine_speaker_by_time(start=segment.start, end=segment.end, segments=relevant_segments)
-        
-        result.messages.append(
-            TranscriptionSegment(
-                speaker=speaker,
-                start=segment.start,
-                end=segment.end,
-                text=segment.text,
+        if not turns:
+            turns = [(segment_speaker, [])]
+        for position, (speaker, turn_words) in enumerate(turns):
+            result.messages.append(
+                TranscriptionSegment(
+                    speaker=speaker,
+                    start=segment.start if position == 0 else turn_words[0].start,
+                    end=segment.end if position == len(turns) - 1 else turn_words[-1].end,
+                    text=''.join(word.text for word in turn_words).strip() if len(turns) > 1 else segment.text,
+                )
             )
-        )
     return result
 
 
+class _BandedMatrix:
+    """
+    Cost matrix of DTW that stores only the columns ``lo[i] <= j < hi[i]`` of every row.
+
+    Cells outside of the band read as infinity, like the borders of the full matrix.
+    """
+
+    def __init__(self, lo: np.ndarray, hi: np.ndarray):
+        self.lo = lo
+        self.hi = hi
+        self.values = np.full((len(lo), int(np.max(hi - lo))), np.inf)
+
+    def get(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        inside = (self.lo[rows] <= columns) & (columns < self.hi[rows])
+        offsets = np.where(inside, columns - self.lo[rows], 0)
+        return np.where(inside, self.values[rows, offsets], np.inf)
+
+    def get_cell(self, row: int, column: int) -> float:
+        if self.lo[row] <= column < self.hi[row]:
+            return self.values[row, column - self.lo[row]]
+        return np.inf
+
 
+def _band_limits(
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    band: float | None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Column range ``[lo, hi)`` of every matrix row, row and column 0 are the borders.
 
+    With a band only the intervals of ``seq2`` within ``band`` seconds of the row interval are kept. The ranges
+    are widened to be monotonic and to overlap, so the band always contains a path from the first to the last cell.
+    """
+    n, m = len(seq1), len(seq2)
+    if band is None:
+        lo = np.ones(n + 1, dtype=np.int64)
+        hi = np.full(n + 1, m + 1, dtype=np.int64)
+    else:
+        # Diarization intervals may be nested, so the lower bound uses the latest end seen so far.
+        lo = np.searchsorted(np.maximum.accumulate(seq2[:, 1]), seq1[:, 0] - band, side='left') + 1
+        hi = np.searchsorted(seq2[:, 0], seq1[:, 1] + band, side='right') + 1
+        lo = np.concatenate([[1], np.maximum.accumulate(np.minimum(lo, m))])
+        hi = np.concatenate([[1], np.maximum.accumulate(hi)])
+        lo[1] = 1
+        hi[-1] = m + 1
+        lo[2:] = np.minimum(lo[2:], hi[1:-1])
+        hi = np.clip(np.maximum(hi, lo + 1), None, m + 1)
+    # Row 0 only holds the starting cell.
+    lo[0], hi[0] = 0, 1
+    return lo, hi
 
-def dtw(seq1: List[Tuple[float, float]], seq2: List[Tuple[float, float]]) -> List[Tuple[int, int]]:
+
+def dtw(
+    seq1: List[Tuple[float, float]],
+    seq2: List[Tuple[float, float]],
+    band: float | None = None,
+) -> List[Tuple[int, int]]:
     """
     Perform Dynamic Time Warping on two sequences of time intervals.
-    
+
+    Cells on one anti-diagonal do not depend on each other, so every anti-diagonal is computed at once.
+    With ``band`` only intervals at most that many seconds apart are compared (a Sakoe-Chiba band), which
+    keeps memory at O(n * band) instead of O(n * m). The result is the same as without the band as long
+    as the optimal path stays inside of it.
+
     :param seq1: List of (start, end) tuples for the first sequence (e.g., transcription)
-    :param seq2: List of (start, end) tuples for the second sequence (e.g., diarization)
+    :param seq2: List of (start, end) tuples for the second sequence (e.g., diarization), sorted by start
+    :param band: Maximal distance in seconds between compared intervals, None compares all of them
     :return: List of matched indices (i, j) where i is the index in seq1 and j is the index in seq2
     """
     n, m = len(seq1), len(seq2)
-    dtw_matrix = np.zeros((n+1, m+1))
-    dtw_matrix[0, 1:] = np.inf
-    dtw_matrix[1:, 0] = np.inf
-    
-    for i in range(1, n+1):
-        for j in range(1, m+1):
-            cost = abs(seq1[i-1][0] - seq2[j-1][0]) + abs(seq1[i-1][1] - seq2[j-1][1])
-            dtw_matrix[i, j] = cost + min(dtw_matrix[i-1, j], dtw_matrix[i, j-1], dtw_matrix[i-1, j-1])
-    
+    if not n or not m:
+        return []
+    seq1 = np.asarray(seq1, dtype=np.float64).reshape(n, 2)
+    seq2 = np.asarray(seq2, dtype=np.float64).reshape(m, 2)
+    lo, hi = _band_limits(seq1, seq2, band)
+    matrix = _BandedMatrix(lo, hi)
+    matrix.values[0, 0] = 0
+
+    # Both are strictly increasing, so the rows crossing an anti-diagonal are found by binary search.
+    rows = np.arange(n + 1)
+    first_columns = lo + rows
+    last_columns = hi + rows
+    for diagonal in range(2, n + m + 1):
+        i = np.arange(
+            max(1, np.searchsorted(last_columns, diagonal, side='right')),
+            np.searchsorted(first_columns, diagonal, side='right'),
+        )
+        j = diagonal - i
+        cost = np.abs(seq1[i - 1, 0] - seq2[j - 1, 0]) + np.abs(seq1[i - 1, 1] - seq2[j - 1, 1])
+        previous = np.minimum(np.minimum(matrix.get(i - 1, j), matrix.get(i, j - 1)), matrix.get(i - 1, j - 1))
+        matrix.values[i, j - lo[i]] = cost + previous
+
     # Backtracking to find the optimal path
     i, j = n, m
-    path = [(i-1, j-1)]
+    path = [(i - 1, j - 1)]
     while i > 1 and j > 1:
-        if i == 1:
-            j -= 1
-        elif j == 1:
+        diagonal_cost = matrix.get_cell(i - 1, j - 1)
+        up_cost = matrix.get_cell(i - 1, j)
+        left_cost = matrix.get_cell(i, j - 1)
+        best = min(diagonal_cost, up_cost, left_cost)
+        if diagonal_cost == best:
+            i, j = i - 1, j - 1
+        elif up_cost == best:
             i -= 1
         else:
-            if dtw_matrix[i-1, j-1] == min(dtw_matrix[i-1, j-1], dtw_matrix[i-1, j], dtw_matrix[i, j-1]):
-                i, j = i-1, j-1
-            elif dtw_matrix[i-1, j] == min(dtw_matrix[i-1, j-1], dtw_matrix[i-1, j], dtw_matrix[i, j-1]):
-                i -= 1
-            else:
-                j -= 1
-        path.append((i-1, j-1))
-    
+            j -= 1
+        path.append((i - 1, j - 1))
+
     return path[::-1]
 
+
 def align_transcription_and_diarization(transcription: List[TranscriptionSegment], 
-                                        diarization: List[SpeakerSegment]) -> List[TranscriptionSegment]:
+                                        diarization: List[SpeakerSegment],
+                                        band: float | None = None) -> List[TranscriptionSegment]:
     """
     Align transcription segments with diarization segments using DTW.
     
     :param transcription: List of TranscriptionSegment objects
     :param diarization: List of SpeakerSegment objects
+    :param band: Width of the DTW band in seconds, None aligns without a band
     :return: List of aligned TranscriptionSegment objects with updated speaker information
     """
     trans_intervals = [(seg.start, seg.end) for seg in transcription]
     diar_intervals = [(seg.start, seg.end) for seg in diarization]
     
-    alignment = dtw(trans_intervals, diar_intervals)
+    alignment = dtw(trans_intervals, diar_intervals, band=band)
     
     aligned_transcription = []
     for trans_idx, diar_idx in alignment:
@@ -168,8 +310,15 @@ def align_transcription_and_diarization(transcription: List[TranscriptionSegment
     return aligned_transcription
 
 # Usage in your annotate function:
-def annotate_dtw(stt_result: SpeachToTextResult, diarization_result: DiarizationResult) -> TranscriptionResult:
+def annotate_dtw(
+    stt_result: SpeachToTextResult,
+    diarization_result: DiarizationResult,
+    band: float | None = None,
+) -> TranscriptionResult:
+    if not stt_result.segments or not diarization_result.segments:
+        # Nothing to align, every message is left to the overlap rule and gets 'unknown' without speakers.
+        return annotate(stt_result, diarization_result)
     result = TranscriptionResult()
-    aligned_segments = align_transcription_and_diarization(stt_result.segments, diarization_result.segments)
+    aligned_segments = align_transcription_and_diarization(stt_result.segments, diarization_result.segments, band)
     result.messages = aligned_segments
     return result
\ No newline at end of file
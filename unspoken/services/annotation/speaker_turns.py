@@ -0,0 +1,76 @@
+from unspoken.enitites.diarization import SpeakerSegment
+
+
+def merge_speaker_turns(segments: list[SpeakerSegment], max_duration: float, max_gap: float) -> list[SpeakerSegment]:
+    """
+    Merge adjacent segments of the same speaker into turns no longer than ``max_duration``.
+
+    Overlapping speech is given to the longer of the overlapping segments first, so every moment of the
+    recording belongs to one turn only and is transcribed once.
+
+    :param segments: Diarization segments.
+    :param max_duration: Maximum turn length in seconds, longer segments are cut into several turns.
+    :param max_gap: Maximum pause in seconds between two segments of one turn.
+    :return: Turns ordered by start time.
+    """
+    turns = []
+    for segment in _resolve_overlaps(segments):
+        last = turns[-1] if turns else None
+        if (
+            last
+            and last.speaker == segment.speaker
+            and segment.start - last.end <= max_gap
+            and max(last.end, segment.end) - last.start <= max_duration
+        ):
+            last.end = max(last.end, segment.end)
+            last.duration = round(last.end - last.start, 3)
+            continue
+
+        start = segment.start
+        while segment.end - start > max_duration:
+            turns.append(
+                SpeakerSegment(
+                    id=len(turns),
+                    start=start,
+                    end=round(start + max_duration, 3),
+                    duration=max_duration,
+                    speaker=segment.speaker,
+                )
+            )
+            start = round(start + max_duration, 3)
+        turns.append(
+            SpeakerSegment(
+                id=len(turns),
+                start=start,
+                end=segment.end,
+                duration=round(segment.end - start, 3),
+                speaker=segment.speaker,
+            )
+        )
+    return turns
+
+
+def _resolve_overlaps(segments: list[SpeakerSegment]) -> list[SpeakerSegment]:
+    """Cut the segments into non-overlapping pieces, every overlap goes to the longest segment covering it."""
+    boundaries = sorted({point for segment in segments for point in (segment.start, segment.end)})
+    pieces = []
+    for start, end in zip(boundaries, boundaries[1:]):
+        covering = [segment for segment in segments if segment.start <= start and segment.end >= end]
+        if not covering:
+            continue
+        owner = max(covering, key=lambda segment: (segment.duration, -segment.start))
+        last = pieces[-1] if pieces else None
+        if last and last.speaker == owner.speaker and last.end == start:
+            last.end = end
+            last.duration = round(end - last.start, 3)
+            continue
+        pieces.append(
+            SpeakerSegment(
+                id=len(pieces),
+                start=start,
+                end=end,
+                duration=round(end - start, 3),
+                speaker=owner.speaker,
+            )
+        )
+    return pieces
@@ -1,10 +1,22 @@
 import logging
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
 from tempfile import NamedTemporaryFile
 
+import numpy as np
 from pydub import AudioSegment
 
+from unspoken.exceptions import DecodingError
+from unspoken.settings import settings
+
 logger = logging.getLogger(__name__)
 
+SAMPLE_RATE = 16000
+
+_SAMPLE_SIZE = np.dtype(np.float32).itemsize
+
 
 def _to_segment(audio_data: bytes, format_: str | None = 'wav') -> AudioSegment:
     with NamedTemporaryFile('w+b') as file:
@@ -33,3 +45,215 @@ def convert_to_wav(file: bytes, sample_rate: str = '44100', bit_rate: str = '16k
             '1',
         ],
     )
+
+
+def allocate_samples(samples: int) -> np.ndarray:
+    """Allocate a float32 waveform, memory-mapped from ``temp_files_dir`` above ``decode_memmap_threshold``."""
+    if samples * _SAMPLE_SIZE < settings.decode_memmap_threshold:
+        return np.empty(samples, dtype=np.float32)
+    Path(settings.temp_files_dir).mkdir(parents=True, exist_ok=True)
+    # The file is unlinked on close, the mapping keeps the data alive until the array is released.
+    with tempfile.TemporaryFile(dir=settings.temp_files_dir) as file:
+        return np.memmap(file, dtype=np.float32, mode='w+', shape=(samples,))
+
+
+def _grow_samples(buffer: np.ndarray) -> np.ndarray:
+    grown = allocate_samples(len(buffer) + len(buffer) // 2 + SAMPLE_RATE)
+    grown[: len(buffer)] = buffer
+    return grown
+
+
+def decode_audio(path: str | Path, sample_rate: int = SAMPLE_RATE, duration: float | None = None) -> np.ndarray:
+    """
+    Decode a media file into a mono float32 waveform in [-1, 1], the input format of both models.
+
+    ffmpeg reads the file from disk and streams raw samples through a pipe straight into a buffer sized
+    from the media duration, so the source is never loaded into memory. Buffers larger than
+    ``decode_memmap_threshold`` bytes are memory-mapped files in ``temp_files_dir``.
+
+    :param path: Path to the media file.
+    :param sample_rate: Sample rate of the returned waveform.
+    :param duration: Media duration in seconds if already known, probed otherwise.
+    :return: Read-only waveform, it can be shared between stages without copying.
+    """
+    if duration is None:
+        duration = probe_duration(path)
+    buffer = allocate_samples(int((duration or 60) * sample_rate) + sample_rate)
+    view = memoryview(buffer).cast('B')
+    filled = 0
+
+    with (
+        tempfile.TemporaryFile() as stderr,
+        subprocess.Popen(
+            [
+                'ffmpeg',
+                '-nostdin',
+                '-v',
+                'error',
+                '-i',
+                str(path),
+                '-map',
+                '0:a:0',
+                '-f',
+                'f32le',
+                '-acodec',
+                'pcm_f32le',
+                '-ac',
+                '1',
+                '-ar',
+                str(sample_rate),
+                '-',
+            ],
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            bufsize=0,
+        ) as process,
+    ):
+        try:
+            while True:
+                if filled == len(view):
+                    view.release()
+                    buffer = _grow_samples(buffer)
+                    view = memoryview(buffer).cast('B')
+                read = process.stdout.readinto(view[filled : filled + settings.decode_read_size])
+                if not read:
+                    break
+                filled += read
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            view.release()
+        return_code = process.wait()
+        stderr.seek(0)
+        error = stderr.read().decode(errors='replace').strip()
+
+    if return_code != 0:
+        raise DecodingError(f'ffmpeg failed to decode {path} with code {return_code}: {error}')
+    samples = filled // _SAMPLE_SIZE
+    if not samples:
+        raise DecodingError(f'No audio decoded from {path}: {error}')
+    logger.info(
+        'Decoded %s into %.1f s of audio (%s).',
+        path,
+        samples / sample_rate,
+        'memory-mapped' if isinstance(buffer, np.memmap) else 'in memory',
+    )
+    waveform = buffer[:samples]
+    waveform.flags.writeable = False
+    return waveform
+
+
+class PcmDecoder:
+    """Converts a stream of 16-bit little-endian mono PCM at ``SAMPLE_RATE`` into float32 waveform pieces."""
+
+    def __init__(self):
+        self._remainder = b''
+
+    def feed(self, data: bytes) -> np.ndarray:
+        data = self._remainder + data
+        size = len(data) - len(data) % 2
+        self._remainder = data[size:]
+        return np.frombuffer(data[:size], dtype='<i2').astype(np.float32) / 32768.0
+
+    def close(self) -> np.ndarray:
+        self._remainder = b''
+        return np.zeros(0, dtype=np.float32)
+
+
+class StreamDecoder:
+    """
+    Decodes a media stream that arrives in pieces, like Ogg or WebM Opus, with a long-running ffmpeg process.
+
+    ``feed`` returns the samples ffmpeg produced so far, which can be fewer than the data fed in until ffmpeg
+    has seen enough input. ``close`` ends the stream and returns the rest.
+    """
+
+    def __init__(self, input_args: list[str] | None = None, sample_rate: int = SAMPLE_RATE):
+        self._process = subprocess.Popen(
+            [
+                'ffmpeg',
+                '-v',
+                'error',
+                '-fflags',
+                'nobuffer',
+                *(input_args or []),
+                '-i',
+                'pipe:0',
+                '-f',
+                'f32le',
+                '-acodec',
+                'pcm_f32le',
+                '-ac',
+                '1',
+                '-ar',
+                str(sample_rate),
+                'pipe:1',
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0,
+        )
+        self._lock = threading.Lock()
+        self._output = bytearray()
+        self._reader = threading.Thread(target=self._read, name='stream-decoder', daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        while chunk := self._process.stdout.read(settings.decode_read_size):
+            with self._lock:
+                self._output.extend(chunk)
+
+    def _take(self) -> np.ndarray:
+        with self._lock:
+            size = len(self._output) - len(self._output) % _SAMPLE_SIZE
+            data = bytes(self._output[:size])
+            del self._output[:size]
+        return np.frombuffer(data, dtype=np.float32)
+
+    def feed(self, data: bytes) -> np.ndarray:
+        try:
+            self._process.stdin.write(data)
+        except BrokenPipeError as e:
+            raise DecodingError('ffmpeg stopped decoding the stream.') from e
+        return self._take()
+
+    def close(self) -> np.ndarray:
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._reader.join()
+        self._process.wait()
+        return self._take()
+
+
+def probe_duration(path: str | Path) -> float | None:
+    """
+    Read the media duration in seconds from the container using ffprobe.
+
+    :param path: Path to the media file.
+    :return: Duration in seconds or None if it can not be determined.
+    """
+    try:
+        result = subprocess.run(
+            [
+                'ffprobe',
+                '-v',
+                'error',
+                '-show_entries',
+                'format=duration',
+                '-of',
+                'default=noprint_wrappers=1:nokey=1',
+                str(path),
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=60,
+        )
+        return float(result.stdout.strip())
+    except (OSError, ValueError, subprocess.SubprocessError):
+        logger.warning('Unable to probe duration of %s', path)
+        return None
@@ -0,0 +1,150 @@
+import logging
+
+import numpy as np
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+from unspoken.enitites.diarization import SpeakerSegment, DiarizationResult
+from unspoken.enitites.speach_to_text import SpeachToTextResult, SpeachToTextSegment
+from unspoken.enitites.transcription import TranscriptionResult
+from unspoken.services.audio.converter import SAMPLE_RATE, allocate_samples
+
+logger = logging.getLogger(__name__)
+
+
+class SpeechMap:
+    """
+    Speech spans of a recording and the mapping between the recording and its compacted waveform.
+
+    The compacted waveform is the speech spans put one after another. Models run on it, so their work scales
+    with the amount of speech, and their timestamps are mapped back to the recording afterwards.
+    """
+
+    def __init__(self, spans: list[tuple[int, int]], samples: int):
+        """
+        :param spans: Sorted, non-overlapping ``(start, end)`` sample ranges of speech in the recording.
+        :param samples: Length of the recording in samples.
+        """
+        self._samples = samples
+        self._starts = np.array([start for start, _ in spans], dtype=np.int64)
+        self._ends = np.array([end for _, end in spans], dtype=np.int64)
+        lengths = self._ends - self._starts
+        # Where every span starts and ends in the compacted waveform.
+        self._compact_ends = np.cumsum(lengths)
+        self._compact_starts = self._compact_ends - lengths
+
+    @property
+    def duration(self) -> float:
+        return self._samples / SAMPLE_RATE
+
+    @property
+    def speech_duration(self) -> float:
+        return int(self._compact_ends[-1]) / SAMPLE_RATE if len(self._compact_ends) else 0.0
+
+    def compact(self, audio: np.ndarray) -> np.ndarray:
+        # Allocated like the decoded waveform, so a long recording is not held in memory twice.
+        compacted = allocate_samples(int(self._compact_ends[-1]) if len(self._compact_ends) else 0)
+        for start, end, compact_start, compact_end in zip(
+            self._starts, self._ends, self._compact_starts, self._compact_ends
+        ):
+            compacted[compact_start:compact_end] = audio[start:end]
+        compacted.flags.writeable = False
+        return compacted
+
+    def to_original(self, time: float, end: bool = False) -> float:
+        """
+        Map a time of the compacted waveform to the recording.
+
+        A time at the joint of two spans is the end of the first span when ``end`` is set and the start
+        of the second one otherwise.
+        """
+        position = time * SAMPLE_RATE
+        bounds = self._compact_ends if end else self._compact_starts
+        index = np.searchsorted(bounds, position, side='left' if end else 'right') - (0 if end else 1)
+        index = min(max(int(index), 0), len(bounds) - 1)
+        return round(float(self._starts[index] + position - self._compact_starts[index]) / SAMPLE_RATE, 3)
+
+    def _split(self, start: float, end: float) -> list[tuple[float, float]]:
+        """Map a compacted time range to the parts of the recording it covers, one per speech span."""
+        first = np.searchsorted(self._compact_ends, start * SAMPLE_RATE, side='right')
+        last = np.searchsorted(self._compact_starts, end * SAMPLE_RATE, side='left')
+        parts = []
+        for index in range(first, last):
+            part_start = max(start * SAMPLE_RATE, self._compact_starts[index])
+            part_end = min(end * SAMPLE_RATE, self._compact_ends[index])
+            if part_start < part_end:
+                shift = self._starts[index] - self._compact_starts[index]
+                parts.append(
+                    (round(float(part_start + shift) / SAMPLE_RATE, 3), round(float(part_end + shift) / SAMPLE_RATE, 3))
+                )
+        return parts
+
+    def remap_segment(self, segment: SpeachToTextSegment) -> SpeachToTextSegment:
+        return segment.model_copy(
+            update={
+                'start': self.to_original(segment.start),
+                'end': self.to_original(segment.end, end=True),
+                'words': [
+                    word.model_copy(
+                        update={'start': self.to_original(word.start), 'end': self.to_original(word.end, end=True)}
+                    )
+                    for word in segment.words
+                ],
+            }
+        )
+
+    def remap_transcription(self, result: SpeachToTextResult) -> SpeachToTextResult:
+        return SpeachToTextResult(segments=[self.remap_segment(segment) for segment in result.segments])
+
+    def remap_annotation(self, result: TranscriptionResult) -> TranscriptionResult:
+        return result.model_copy(
+            update={
+                'messages': [
+                    message.model_copy(
+                        update={
+                            'start': self.to_original(message.start),
+                            'end': self.to_original(message.end, end=True),
+                        }
+                    )
+                    for message in result.messages
+                ]
+            }
+        )
+
+    def remap_diarization(self, result: DiarizationResult) -> DiarizationResult:
+        """Map speaker segments to the recording, segments that cross a removed silence are split at it."""
+        remapped = result.model_copy(update={'segments': []})
+        for segment in result.segments:
+            for start, end in self._split(segment.start, segment.end):
+                remapped.segments.append(
+                    SpeakerSegment(
+                        id=len(remapped.segments),
+                        start=start,
+                        end=end,
+                        duration=round(end - start, 3),
+                        speaker=segment.speaker,
+                    )
+                )
+        return remapped
+
+
+def detect_speech(audio: np.ndarray, min_silence: float, speech_pad: float) -> SpeechMap:
+    """
+    Find speech in a recording with the Silero VAD.
+
+    :param audio: Waveform of the recording.
+    :param min_silence: Only silences longer than this many seconds are removed.
+    :param speech_pad: Seconds of audio kept around every speech span.
+    :return: Speech map of the recording.
+    """
+    speech = get_speech_timestamps(
+        audio,
+        VadOptions(min_silence_duration_ms=int(min_silence * 1000), speech_pad_ms=int(speech_pad * 1000)),
+    )
+    spans = []
+    for region in speech:
+        start, end = max(region['start'], 0), min(region['end'], len(audio))
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], end))
+        elif start < end:
+            spans.append((start, end))
+    return SpeechMap(spans, len(audio))
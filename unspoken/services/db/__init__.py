@@ -1,23 +1,47 @@
 from .base import (
+    TASK_EVENTS_CHANNEL,
+    Job,
     Message,
     Session,
     Speaker,
     Task,
     TempFile,
+    UploadSession,
+    advance_upload_session,
+    cancel_task,
+    claim_job,
+    close_upload_session,
     create_new_task,
     create_speaker,
+    create_upload_session,
+    delete_expired_upload_sessions,
+    delete_task_results,
+    delete_upload_session,
+    enqueue_job,
+    fail_exhausted_jobs,
+    finish_job,
+    get_active_jobs,
     get_message,
+    get_recent_real_time_factor,
     get_speaker,
     get_task,
     get_task_messages,
+    get_task_state,
+    get_task_status,
     get_task_speakers,
     get_temp_file,
+    get_upload_session,
+    get_upload_sessions_size,
+    renew_job_leases,
     save_diarization_result,
     save_messages,
     save_speach_to_text_result,
+    save_task_progress,
     save_temp_file,
     save_transcription_result,
+    set_task_status,
     update_message,
     update_speaker,
     update_task,
+    update_temp_file,
 )
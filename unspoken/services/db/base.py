@@ -2,15 +2,22 @@ import datetime
 import logging
 import os
 import traceback
+import uuid
 from pathlib import Path
+from typing import BinaryIO
 import json
 import sqlalchemy as sa
 from sqlalchemy.orm import Mapped, declarative_base, mapped_column, relationship, scoped_session, sessionmaker
 from alembic import command
 from alembic.config import Config
 from alembic.script import ScriptDirectory
+from unspoken.enitites.enums.decoding_preset import DecodingPreset
+from unspoken.enitites.enums.job_status import JobStatus
 from unspoken.enitites.enums.mime_types import MimeType
+from unspoken.enitites.enums.scheduler_policy import SchedulerPolicy
+from unspoken.enitites.enums.task_stage import TaskStage
 from unspoken.enitites.enums.task_status import TaskStatus
+from unspoken.enitites.enums.transcription_model import TranscriptionModel
 from unspoken.exceptions import TranscriptNotFound
 from unspoken.settings import settings
 
@@ -95,6 +102,16 @@ def setup() -> None:
     apply_migrations()
 
 
+def _transcription_model_enum() -> sa.Enum:
+    # Model names contain dashes, so values are stored instead of member names.
+    return sa.Enum(
+        TranscriptionModel,
+        native_enum=False,
+        length=32,
+        values_callable=lambda enum: [member.value for member in enum],
+    )
+
+
 class Transcript(Base):
     __tablename__ = 'transcript'
 
@@ -116,20 +133,26 @@ class TempFile(Base):
         nullable=False,
     )
 
+    @property
+    def path(self) -> Path:
+        return Path(settings.temp_files_dir) / self.file_name
+
+    def open(self, mode: str = 'rb') -> BinaryIO:
+        return open(self.path, mode)
+
     def write(self, data: bytes) -> None:
-        path = Path(settings.temp_files_dir) / self.file_name
-        with open(path, 'wb') as f:
+        with self.open('wb') as f:
             f.write(data)
 
     def read(self) -> bytes:
-        path = Path(settings.temp_files_dir) / self.file_name
-        with open(path, 'rb') as f:
+        with self.open('rb') as f:
             return f.read()
 
     def delete(self) -> None:
-        path = Path(settings.temp_files_dir) / self.file_name
+        path = self.path
         logger.info('Deleting file %s', str(path))
-        os.remove(Path(settings.temp_files_dir) / self.file_name)
+        if path.exists():
+            os.remove(path)
         if path.exists():
             logger.warning('File %s still exists after delete', str(path))
         with Session() as s:
@@ -138,6 +161,22 @@ class TempFile(Base):
             return
 
 
+class UploadSession(Base):
+    __tablename__ = 'upload_session'
+
+    id: Mapped[str] = mapped_column(sa.String(36), primary_key=True)
+    temp_file_id: Mapped[int] = mapped_column(sa.ForeignKey(TempFile.id), nullable=False)
+    temp_file: Mapped[TempFile] = relationship(TempFile, foreign_keys=[temp_file_id], lazy='joined')
+    uploaded_file_name: Mapped[str] = mapped_column(sa.String(255), nullable=True)
+    size: Mapped[int] = mapped_column(sa.BigInteger, nullable=False)
+    offset: Mapped[int] = mapped_column(sa.BigInteger, nullable=False, default=0)
+    preset: Mapped[DecodingPreset] = mapped_column(sa.Enum(DecodingPreset, native_enum=False), nullable=True)
+    model: Mapped[TranscriptionModel] = mapped_column(_transcription_model_enum(), nullable=True)
+    num_speakers: Mapped[int] = mapped_column(sa.Integer, nullable=True)
+    min_speakers: Mapped[int] = mapped_column(sa.Integer, nullable=True)
+    max_speakers: Mapped[int] = mapped_column(sa.Integer, nullable=True)
+
+
 class Task(Base):
     __tablename__ = 'task'
 
@@ -147,7 +186,21 @@ class Task(Base):
         nullable=False,
         default=TaskStatus.queued,
     )
+    stage: Mapped[TaskStage] = mapped_column(sa.Enum(TaskStage, native_enum=False), nullable=True)
     uploaded_file_name: Mapped[str] = mapped_column(sa.String(255), nullable=True)
+    duration: Mapped[float] = mapped_column(sa.Float, nullable=True)
+    started_at: Mapped[datetime.datetime] = mapped_column(sa.DateTime, nullable=True)
+    finished_at: Mapped[datetime.datetime] = mapped_column(sa.DateTime, nullable=True)
+    progress: Mapped[float] = mapped_column(sa.Float, nullable=True)
+    preset: Mapped[DecodingPreset] = mapped_column(
+        sa.Enum(DecodingPreset, native_enum=False),
+        nullable=True,
+        default=DecodingPreset.accurate,
+    )
+    model: Mapped[TranscriptionModel] = mapped_column(_transcription_model_enum(), nullable=True)
+    num_speakers: Mapped[int] = mapped_column(sa.Integer, nullable=True)
+    min_speakers: Mapped[int] = mapped_column(sa.Integer, nullable=True)
+    max_speakers: Mapped[int] = mapped_column(sa.Integer, nullable=True)
     transcript_id: Mapped[int] = mapped_column(sa.ForeignKey(Transcript.id), nullable=False)
     transcript: Mapped[Transcript] = relationship(Transcript, foreign_keys=[transcript_id], lazy='joined')
 
@@ -166,13 +219,33 @@ class Message(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     speaker_id: Mapped[int] = mapped_column(sa.ForeignKey(Speaker.id), nullable=True)
     speaker: Mapped[Speaker] = relationship(Speaker, foreign_keys=[speaker_id], lazy='joined')
-    task_id: Mapped[int] = mapped_column(sa.ForeignKey(Task.id), nullable=False)
+    task_id: Mapped[int] = mapped_column(sa.ForeignKey(Task.id), nullable=False, index=True)
     task: Mapped[Task] = relationship(Task, foreign_keys=[task_id], lazy='joined')
     text: Mapped[str] = mapped_column(sa.Text, nullable=False)
     start_time: Mapped[float] = mapped_column(sa.Float, nullable=False)
     end_time: Mapped[float] = mapped_column(sa.Float, nullable=False)
 
 
+class Job(Base):
+    __tablename__ = 'job'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    task_id: Mapped[int] = mapped_column(sa.ForeignKey(Task.id), nullable=False)
+    temp_file_id: Mapped[int] = mapped_column(sa.Integer, nullable=False)
+    size: Mapped[int] = mapped_column(sa.BigInteger, nullable=True)
+    duration: Mapped[float] = mapped_column(sa.Float, nullable=True)
+    model: Mapped[TranscriptionModel] = mapped_column(_transcription_model_enum(), nullable=True)
+    status: Mapped[JobStatus] = mapped_column(
+        sa.Enum(JobStatus, native_enum=False),
+        nullable=False,
+        default=JobStatus.queued,
+        index=True,
+    )
+    attempts: Mapped[int] = mapped_column(sa.Integer, nullable=False, default=0)
+    worker_id: Mapped[str] = mapped_column(sa.String(255), nullable=True)
+    lease_expires_at: Mapped[datetime.datetime] = mapped_column(sa.DateTime, nullable=True)
+
+
 class LabelingTask(Base):
     __tablename__ = 'labeling_tasks'
 
@@ -191,6 +264,33 @@ class LabelingResult(Base):
     text: Mapped[str] = mapped_column(sa.Text, nullable=False)
 
 
+TASK_EVENTS_CHANNEL = 'task_events'
+
+
+def _notify_task_events(session: Session, task_ids: list[int]) -> None:
+    """
+    Publish the current state of tasks to listeners of ``TASK_EVENTS_CHANNEL``.
+
+    The notification is part of the session transaction, so it is delivered on commit and never announces
+    a change that was rolled back.
+    """
+    if not task_ids:
+        return
+    payload = sa.func.json_build_object(
+        'task_id',
+        Task.id,
+        'status',
+        Task.status,
+        'stage',
+        Task.stage,
+        'progress',
+        Task.progress,
+    )
+    session.execute(
+        sa.select(sa.func.pg_notify(TASK_EVENTS_CHANNEL, sa.cast(payload, sa.Text))).where(Task.id.in_(task_ids))
+    )
+
+
 def create_speaker(name: str, task_id: int, session: Session = None) -> Speaker:
     session = session or Session()
     with session:
@@ -208,6 +308,27 @@ def save_messages(messages: list[Message], session: Session = None) -> None:
         session.commit()
 
 
+def save_task_progress(task_id: int, messages: list[Message], progress: float, session: Session = None) -> None:
+    """Store partial messages of a task being processed together with its progress in percent."""
+    session = session or Session()
+    with session:
+        session.add_all(messages)
+        session.execute(
+            sa.update(Task).where(Task.id == task_id).values(progress=progress, updated_at=datetime.datetime.utcnow())
+        )
+        _notify_task_events(session, [task_id])
+        session.commit()
+
+
+def delete_task_results(task_id: int, session: Session = None) -> None:
+    """Delete messages and speakers of a task, so it can be saved again from scratch."""
+    session = session or Session()
+    with session:
+        session.execute(sa.delete(Message).where(Message.task_id == task_id))
+        session.execute(sa.delete(Speaker).where(Speaker.task_id == task_id))
+        session.commit()
+
+
 def create_new_task(**kwargs) -> Task:
     with Session() as s:
         task = Task(
@@ -228,12 +349,124 @@ def save_temp_file(file: TempFile) -> TempFile:
         return file
 
 
+def update_temp_file(temp_file: TempFile, session: Session = None, **kwargs) -> TempFile:
+    session = session or Session()
+    with session:
+        session.add(temp_file)
+        logger.debug('Updating temp file %s with properties %s', temp_file, kwargs)
+        for key, value in kwargs.items():
+            setattr(temp_file, key, value)
+        session.commit()
+        session.refresh(temp_file)
+        return temp_file
+
+
 def get_temp_file(id_: int) -> TempFile | None:
     with Session() as s:
         query = sa.select(TempFile).where(TempFile.id == id_)
         return s.execute(query).scalar_one_or_none()
 
 
+def create_upload_session(
+    uploaded_file_name: str | None,
+    size: int,
+    preset: DecodingPreset = DecodingPreset.accurate,
+    model: TranscriptionModel | None = None,
+    **speaker_hints: int | None,
+) -> UploadSession:
+    session_id = str(uuid.uuid4())
+    with Session() as s:
+        temp_file = TempFile(file_name=session_id, file_type=MimeType.unknown)
+        upload_session = UploadSession(
+            id=session_id,
+            temp_file=temp_file,
+            uploaded_file_name=uploaded_file_name,
+            size=size,
+            offset=0,
+            preset=preset,
+            model=model,
+            **speaker_hints,
+        )
+        s.add(upload_session)
+        s.commit()
+        s.refresh(upload_session)
+        temp_file.write(b'')
+        return upload_session
+
+
+def get_upload_session(id_: str) -> UploadSession | None:
+    with Session() as s:
+        query = sa.select(UploadSession).where(UploadSession.id == id_)
+        return s.execute(query).scalar_one_or_none()
+
+
+def advance_upload_session(id_: str, offset: int, new_offset: int) -> bool:
+    """
+    Move the committed offset of the upload session forward.
+
+    The update only happens when the committed offset is still equal to ``offset``,
+    so two concurrent writers of the same range cannot both commit it.
+
+    :return: True if the offset was moved, False if it was changed by someone else.
+    """
+    with Session() as s:
+        query = (
+            sa.update(UploadSession)
+            .where(UploadSession.id == id_, UploadSession.offset == offset)
+            .values(offset=new_offset, updated_at=datetime.datetime.utcnow())
+        )
+        updated = s.execute(query).rowcount
+        s.commit()
+        return updated == 1
+
+
+def close_upload_session(id_: str, file_type: MimeType | None = None) -> TempFile | None:
+    """
+    Remove a complete upload session, its temp file is kept.
+
+    The row is only deleted while the whole file is committed, so of concurrent calls exactly one gets the file.
+
+    :param file_type: Sniffed type of the uploaded file, stored on the temp file when given.
+    :return: Temp file of the upload session, None if it is gone or incomplete.
+    """
+    with Session() as s:
+        query = (
+            sa.delete(UploadSession)
+            .where(UploadSession.id == id_, UploadSession.offset == UploadSession.size)
+            .returning(UploadSession.temp_file_id)
+        )
+        temp_file_id = s.execute(query).scalar_one_or_none()
+        if temp_file_id is None:
+            s.rollback()
+            return None
+        temp_file = s.get(TempFile, temp_file_id)
+        if file_type is not None:
+            temp_file.file_type = file_type
+        s.commit()
+        s.refresh(temp_file)
+        return temp_file
+
+
+def delete_upload_session(upload_session: UploadSession, delete_temp_file: bool = True) -> None:
+    temp_file = upload_session.temp_file
+    with Session() as s:
+        s.delete(upload_session)
+        s.commit()
+    if delete_temp_file:
+        temp_file.delete()
+
+
+def delete_expired_upload_sessions(ttl: int) -> int:
+    expired_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=ttl)
+    with Session() as s:
+        query = sa.select(UploadSession).where(UploadSession.updated_at < expired_before)
+        expired_sessions = list(s.execute(query).scalars().all())
+    for upload_session in expired_sessions:
+        logger.info('Deleting abandoned upload session %s', upload_session.id)
+        delete_upload_session(upload_session)
+    return len(expired_sessions)
+
+
 def get_task(id_: int, session: Session = None, detach: bool = False) -> Task | None:
     session = session or Session()
     query = sa.select(Task).where(Task.id == id_)
@@ -247,6 +480,72 @@ def get_task(id_: int, session: Session = None, detach: bool = False) -> Task |
         return task
 
 
+def get_task_state(id_: int) -> sa.Row | None:
+    """Read the status, stage and progress of a task without loading its transcript."""
+    with Session() as s:
+        query = sa.select(Task.id, Task.status, Task.stage, Task.progress).where(Task.id == id_)
+        return s.execute(query).one_or_none()
+
+
+def get_task_status(id_: int) -> TaskStatus | None:
+    with Session() as s:
+        query = sa.select(Task.status).where(Task.id == id_)
+        return s.execute(query).scalar_one_or_none()
+
+
+def cancel_task(id_: int) -> int | None:
+    """
+    Mark the task as cancelled and drop its job if it has not been claimed yet.
+
+    A running job is left to the worker, which stops at the next cancellation check.
+
+    :param id_: Task id.
+    :return: Id of the temp file of the dropped job, the caller is responsible for deleting it.
+    """
+    with Session() as s:
+        job_query = (
+            sa.select(Job)
+            .where(Job.task_id == id_, Job.status.in_([JobStatus.queued, JobStatus.running]))
+            .with_for_update()
+        )
+        job = s.execute(job_query).scalar_one_or_none()
+        s.execute(
+            sa.update(Task)
+            .where(Task.id == id_, Task.status.in_([TaskStatus.queued, TaskStatus.processing]))
+            .values(status=TaskStatus.cancelled, updated_at=datetime.datetime.utcnow())
+        )
+        temp_file_id = None
+        if job is not None and job.status == JobStatus.queued:
+            job.status = JobStatus.cancelled
+            job.updated_at = datetime.datetime.utcnow()
+            temp_file_id = job.temp_file_id
+        _notify_task_events(s, [id_])
+        s.commit()
+        return temp_file_id
+
+
+def set_task_status(id_: int, status: TaskStatus, **kwargs) -> bool:
+    """
+    Move a task to ``status`` unless it was cancelled, a cancellation is never overwritten by the outcome of a flow.
+
+    :param id_: Task id.
+    :param status: New status.
+    :param kwargs: Other task columns to update together with the status.
+    :return: True if the status was set, False if the task was cancelled and left as it is.
+    """
+    with Session() as s:
+        query = (
+            sa.update(Task)
+            .where(Task.id == id_, Task.status != TaskStatus.cancelled)
+            .values(status=status, updated_at=datetime.datetime.utcnow(), **kwargs)
+        )
+        updated = s.execute(query).rowcount == 1
+        if updated:
+            _notify_task_events(s, [id_])
+        s.commit()
+        return updated
+
+
 def update_task(task: Task, session: Session = None, **kwargs) -> Task:
     session = session or Session()
     with session:
@@ -254,6 +553,8 @@ def update_task(task: Task, session: Session = None, **kwargs) -> Task:
         logger.debug('Updating task %s with properties %s', task, kwargs)
         for key, value in kwargs.items():
             setattr(task, key, value)
+        session.flush()
+        _notify_task_events(session, [task.id])
         session.commit()
         return task
 
@@ -350,3 +651,202 @@ def get_task_messages(task_id, session: Session = None) -> list[Message]:
     with session:
         messages = session.execute(query).scalars().all()
         return list(messages)
+
+
+def _db_utcnow() -> sa.ColumnElement:
+    # Leases are compared against the database clock, so workers on hosts with skewed clocks agree on expiry.
+    return sa.func.timezone('utc', sa.func.now())
+
+
+def enqueue_job(
+    task_id: int,
+    temp_file_id: int,
+    size: int | None = None,
+    duration: float | None = None,
+    model: TranscriptionModel | None = None,
+) -> Job:
+    with Session() as s:
+        job = Job(
+            task_id=task_id,
+            temp_file_id=temp_file_id,
+            size=size,
+            duration=duration,
+            model=model,
+            status=JobStatus.queued,
+        )
+        s.add(job)
+        s.commit()
+        s.refresh(job)
+        return job
+
+
+def fail_exhausted_jobs(max_attempts: int) -> list[Job]:
+    """
+    Mark jobs whose lease expired after ``max_attempts`` claims as failed, together with their tasks.
+
+    :param max_attempts: Number of claims after which a job is not reclaimed anymore.
+    :return: The failed jobs.
+    """
+    with Session() as s:
+        query = (
+            sa.update(Job)
+            .where(
+                Job.status == JobStatus.running,
+                Job.lease_expires_at < _db_utcnow(),
+                Job.attempts >= max_attempts,
+            )
+            .values(status=JobStatus.failed, updated_at=_db_utcnow())
+            .returning(Job)
+        )
+        jobs = list(s.execute(query).scalars().all())
+        for job in jobs:
+            s.expunge(job)
+        if jobs:
+            s.execute(
+                sa.update(Task)
+                .where(Task.id.in_([job.task_id for job in jobs]), Task.status != TaskStatus.cancelled)
+                .values(status=TaskStatus.failed, updated_at=_db_utcnow())
+            )
+            _notify_task_events(s, [job.task_id for job in jobs])
+        s.commit()
+        return jobs
+
+
+def _job_order(policy: SchedulerPolicy) -> list[sa.ColumnElement]:
+    if policy == SchedulerPolicy.shortest_first:
+        # Waiting jobs age: every second in the queue counts as aging_rate seconds less audio,
+        # so long recordings are still picked up eventually.
+        waited = sa.func.extract('epoch', _db_utcnow() - Job.created_at)
+        duration = sa.func.coalesce(Job.duration, settings.short_task_max_duration)
+        return [duration - waited * settings.scheduler_aging_rate, Job.id]
+    return [Job.id]
+
+
+def claim_job(
+    worker_id: str,
+    lease_seconds: int,
+    policy: SchedulerPolicy = SchedulerPolicy.fifo,
+    max_duration: float | None = None,
+    preferred_models: list[TranscriptionModel] | None = None,
+    preference_max_wait: float = 0,
+) -> Job | None:
+    """
+    Claim the next queued job, or a running job whose lease expired.
+
+    Rows locked by other workers are skipped, so any number of workers can claim concurrently.
+    Jobs with expired leases go first, the remaining jobs are ordered by the scheduler policy.
+
+    :param worker_id: Identifier of the claiming worker.
+    :param lease_seconds: For how long the job belongs to the worker without a heartbeat.
+    :param policy: Scheduler policy used to order queued jobs.
+    :param max_duration: Only claim jobs with known audio duration up to this value, used by the short lane.
+    :param preferred_models: Models the worker has loaded, their jobs go before jobs for other models.
+    :param preference_max_wait: Seconds after which a queued job is not passed over for preferred models anymore.
+    :return: The claimed job or None if there is nothing to do.
+    """
+    order = [sa.case((Job.status == JobStatus.running, 0), else_=1)]
+    if preferred_models:
+        preferred = sa.or_(
+            Job.model.is_(None),
+            Job.model.in_(preferred_models),
+            Job.created_at < _db_utcnow() - datetime.timedelta(seconds=preference_max_wait),
+        )
+        order.append(sa.case((preferred, 0), else_=1))
+    with Session() as s:
+        query = (
+            sa.select(Job)
+            .where(
+                sa.or_(
+                    Job.status == JobStatus.queued,
+                    sa.and_(Job.status == JobStatus.running, Job.lease_expires_at < _db_utcnow()),
+                )
+            )
+            .order_by(*order, *_job_order(policy))
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if max_duration is not None:
+            query = query.where(Job.duration <= max_duration)
+        job = s.execute(query).scalar_one_or_none()
+        if job is None:
+            s.rollback()
+            return None
+        if job.status == JobStatus.running:
+            logger.warning('Reclaiming job %s, lease of worker %s expired', job.id, job.worker_id)
+        job.status = JobStatus.running
+        job.worker_id = worker_id
+        job.attempts += 1
+        job.lease_expires_at = _db_utcnow() + datetime.timedelta(seconds=lease_seconds)
+        job.updated_at = _db_utcnow()
+        s.commit()
+        s.refresh(job)
+        return job
+
+
+def renew_job_leases(job_ids: list[int], worker_id: str, lease_seconds: int) -> list[int]:
+    if not job_ids:
+        return []
+    with Session() as s:
+        query = (
+            sa.update(Job)
+            .where(Job.id.in_(job_ids), Job.worker_id == worker_id, Job.status == JobStatus.running)
+            .values(lease_expires_at=_db_utcnow() + datetime.timedelta(seconds=lease_seconds))
+            .returning(Job.id)
+        )
+        renewed = list(s.execute(query).scalars().all())
+        s.commit()
+        return renewed
+
+
+def finish_job(job_id: int, worker_id: str, status: JobStatus) -> None:
+    with Session() as s:
+        query = (
+            sa.update(Job)
+            .where(Job.id == job_id, Job.worker_id == worker_id, Job.status == JobStatus.running)
+            .values(status=status, lease_expires_at=None, updated_at=_db_utcnow())
+        )
+        s.execute(query)
+        s.commit()
+
+
+def get_active_jobs(policy: SchedulerPolicy = SchedulerPolicy.fifo) -> list[sa.Row]:
+    """
+    Queued and running jobs in claim order, together with the start time of their tasks.
+    """
+    with Session() as s:
+        query = (
+            sa.select(Job.id, Job.task_id, Job.status, Job.size, Job.duration, Task.started_at)
+            .join(Task, Task.id == Job.task_id)
+            .where(Job.status.in_([JobStatus.queued, JobStatus.running]))
+            .order_by(sa.case((Job.status == JobStatus.running, 0), else_=1), *_job_order(policy))
+        )
+        return list(s.execute(query).all())
+
+
+def get_upload_sessions_size() -> int:
+    with Session() as s:
+        query = sa.select(sa.func.coalesce(sa.func.sum(UploadSession.size), 0))
+        return int(s.execute(query).scalar_one())
+
+
+def get_recent_real_time_factor(limit: int) -> float | None:
+    """
+    Average ratio of processing time to audio duration over the last ``limit`` completed tasks.
+    """
+    with Session() as s:
+        recent = (
+            sa.select(
+                (sa.func.extract('epoch', Task.finished_at - Task.started_at) / Task.duration).label('rtf'),
+            )
+            .where(
+                Task.status == TaskStatus.completed,
+                Task.duration > 0,
+                Task.started_at.is_not(None),
+                Task.finished_at.is_not(None),
+            )
+            .order_by(Task.finished_at.desc())
+            .limit(limit)
+            .subquery()
+        )
+        rtf = s.execute(sa.select(sa.func.avg(recent.c.rtf))).scalar_one_or_none()
+        return float(rtf) if rtf is not None else None
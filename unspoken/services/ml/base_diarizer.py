@@ -1,12 +1,13 @@
-from abc import abstractmethod
+from abc import ABC, abstractmethod
 
-from unspoken.core.singleton import SingletonABCMeta
-from unspoken.enitites.diarization import DiarizationResult, SpeakerSegment
+import numpy as np
 
+from unspoken.enitites.diarization import SpeakerHints, SpeakerSegment, DiarizationResult
 
-class BaseDiarizer(metaclass=SingletonABCMeta):
+
+class BaseDiarizer(ABC):
     @abstractmethod
-    def diarize(self, wav_data: bytes) -> DiarizationResult:
+    def diarize(self, audio: np.ndarray, hints: SpeakerHints | None = None) -> DiarizationResult:
         raise NotImplementedError
 
     @staticmethod
@@ -0,0 +1,205 @@
+import time
+import logging
+import datetime
+import threading
+
+import numpy as np
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+from unspoken.core.model_registry import model_registry
+from unspoken.core.readiness import add_readiness_check
+from unspoken.enitites.api.live import LiveSegmentEvent
+from unspoken.enitites.diarization import SpeakerSegment, DiarizationResult
+from unspoken.enitites.enums.task_stage import TaskStage
+from unspoken.enitites.enums.task_status import TaskStatus
+from unspoken.enitites.speach_to_text import SpeachToTextResult
+from unspoken.enitites.transcription import TranscriptionResult, TranscriptionSegment
+from unspoken.services import db
+from unspoken.services.audio.converter import SAMPLE_RATE
+from unspoken.services.ml.pipelines.transcribe_flow import warm_up_clip, save_task_results
+from unspoken.services.ml.pyanote_diarizer import PyanoteDiarizer
+from unspoken.services.ml.speaker_centroids import SpeakerCentroids
+from unspoken.services.ml.transcriber import Transcriber
+from unspoken.settings import settings
+
+logger = logging.getLogger('uvicorn')
+
+
+class LiveTranscription:
+    """
+    Transcribes an audio stream while it is being recorded.
+
+    Audio is collected in a rolling buffer. Once voice activity detection sees a long enough pause, the speech
+    before it is transcribed for good and dropped from the buffer. Between pauses the whole buffer is
+    transcribed greedily now and then to produce interim text. Every finalized piece is assigned to a speaker
+    by its embedding against the speakers heard so far.
+
+    The session is stored as a regular task, it is created when the session starts and completed by ``finish``.
+    """
+
+    def __init__(self, name: str | None = None):
+        task = db.create_new_task(
+            uploaded_file_name=name or f'live-{datetime.datetime.utcnow():%Y%m%d-%H%M%S}',
+            status=TaskStatus.processing,
+            stage=TaskStage.transcribing,
+            started_at=datetime.datetime.utcnow(),
+        )
+        self.task_id = task.id
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._offset = 0.0
+        self._unprocessed = 0
+        self._interim_at = 0.0
+        self._centroids = SpeakerCentroids(threshold=settings.diarization_speaker_similarity)
+        self._stt_result = SpeachToTextResult()
+        self._transcription = TranscriptionResult()
+        self._diarization = DiarizationResult()
+        logger.info('Started live transcription for task %s.', self.task_id)
+
+    @property
+    def duration(self) -> float:
+        return self._offset + len(self._buffer) / SAMPLE_RATE
+
+    def feed(self, samples: np.ndarray) -> list[LiveSegmentEvent]:
+        """Add decoded samples to the buffer and return the interim and final segments they produced."""
+        self._buffer = np.concatenate([self._buffer, samples])
+        self._unprocessed += len(samples)
+        if self._unprocessed < settings.live_step * SAMPLE_RATE:
+            return []
+        self._unprocessed = 0
+        return self._process()
+
+    def _process(self) -> list[LiveSegmentEvent]:
+        speech = get_speech_timestamps(
+            self._buffer,
+            VadOptions(min_silence_duration_ms=int(settings.live_silence_duration * 1000), speech_pad_ms=100),
+        )
+        if not speech:
+            # Keep a little audio in front of the speech that may start next.
+            self._advance(max(0, len(self._buffer) - SAMPLE_RATE))
+            return []
+
+        silence = (len(self._buffer) - speech[-1]['end']) / SAMPLE_RATE
+        if silence >= settings.live_silence_duration:
+            return self._finalize(speech[-1]['end'])
+        if len(self._buffer) >= settings.live_max_buffer * SAMPLE_RATE:
+            # No pause long enough, cut at the last short one if there is any.
+            return self._finalize(speech[-1]['start'] if len(speech) > 1 else len(self._buffer))
+
+        now = time.monotonic()
+        if now - self._interim_at < settings.live_interim_interval:
+            return []
+        self._interim_at = now
+        with model_registry.acquire(Transcriber, settings.transcription_model) as transcriber:
+            result = transcriber.transcribe_clip(self._buffer, offset=self._offset, beam_size=1)
+        if not result.segments:
+            return []
+        return [
+            LiveSegmentEvent(
+                type='interim',
+                start=result.segments[0].start,
+                end=result.segments[-1].end,
+                text=' '.join(segment.text for segment in result.segments),
+            )
+        ]
+
+    def _speaker(self, clip: np.ndarray) -> str | None:
+        if len(clip) < settings.live_min_speaker_audio * SAMPLE_RATE:
+            return self._transcription.messages[-1].speaker if self._transcription.messages else None
+        with model_registry.acquire(PyanoteDiarizer) as diarizer:
+            embedding = diarizer.embed(clip)
+        return self._centroids.match({'clip': embedding}, weights={'clip': len(clip) / SAMPLE_RATE})['clip']
+
+    def _finalize(self, end: int) -> list[LiveSegmentEvent]:
+        clip = self._buffer[:end]
+        with model_registry.acquire(Transcriber, settings.transcription_model) as transcriber:
+            result = transcriber.transcribe_clip(clip, offset=self._offset)
+        speaker = self._speaker(clip) if result.segments else None
+        events = []
+        for segment in result.segments:
+            segment.id = len(self._stt_result.segments) + 1
+            self._stt_result.segments.append(segment)
+            self._transcription.messages.append(
+                TranscriptionSegment(
+                    speaker=speaker or 'unknown', start=segment.start, end=segment.end, text=segment.text
+                )
+            )
+            events.append(
+                LiveSegmentEvent(type='final', start=segment.start, end=segment.end, text=segment.text, speaker=speaker)
+            )
+        if result.segments and speaker:
+            self._diarization.segments.append(
+                SpeakerSegment(
+                    id=len(self._diarization.segments),
+                    start=round(self._offset, 3),
+                    end=round(self._offset + len(clip) / SAMPLE_RATE, 3),
+                    duration=round(len(clip) / SAMPLE_RATE, 3),
+                    speaker=speaker,
+                )
+            )
+        self._advance(end)
+        self._interim_at = 0.0
+        return events
+
+    def _advance(self, samples: int) -> None:
+        if samples:
+            self._buffer = self._buffer[samples:].copy()
+            self._offset += samples / SAMPLE_RATE
+
+    def finish(self) -> list[LiveSegmentEvent]:
+        """Finalize the rest of the buffer and store the session, returns the last final segments."""
+        events = self._finalize(len(self._buffer)) if len(self._buffer) else []
+        self._diarization.speakers = self._centroids.labels
+        self._diarization.speakers_count = len(self._diarization.speakers)
+        self._transcription.duration = self.duration
+        save_task_results(
+            task_id=self.task_id,
+            annotated_transcription=self._transcription,
+            diarization_result=self._diarization,
+            transcription_result=self._stt_result,
+        )
+        db.set_task_status(
+            self.task_id,
+            TaskStatus.completed,
+            duration=self.duration,
+            progress=100.0,
+            finished_at=datetime.datetime.utcnow(),
+        )
+        logger.info('Live transcription for task %s completed, %.1f s of audio.', self.task_id, self.duration)
+        return events
+
+    def fail(self) -> None:
+        db.set_task_status(self.task_id, TaskStatus.failed, duration=self.duration)
+
+
+def warm_up_live_models() -> None:
+    """
+    Load the models of live sessions and run them on a short clip.
+
+    Live sessions run in the API process. With a worker pool these are copies of their own next to the models of
+    the workers, without it they are the instances the worker uses.
+    """
+    start_time = time.time()
+    audio = warm_up_clip()
+    with model_registry.acquire(Transcriber, settings.transcription_model) as transcriber:
+        transcriber.transcribe_clip(audio, beam_size=1)
+    with model_registry.acquire(PyanoteDiarizer) as diarizer:
+        diarizer.embed(audio)
+    logger.info('Live models warmed up in %.3f seconds.', time.time() - start_time)
+
+
+def _warm_up(ready_event: threading.Event) -> None:
+    try:
+        warm_up_live_models()
+    except Exception:
+        logger.exception('Unable to warm up live models, the service stays not ready.')
+        return
+    ready_event.set()
+
+
+def start_live_warm_up() -> threading.Thread:
+    """Warm up the models of live sessions in the background, the service is not ready until they are loaded."""
+    ready_event = threading.Event()
+    add_readiness_check(ready_event.is_set)
+    thread = threading.Thread(target=_warm_up, args=(ready_event,), name='live-warm-up', daemon=True)
+    thread.start()
+    return thread
@@ -1,24 +1,44 @@
+import time
 import logging
+import datetime
+import dataclasses
+from typing import Callable
+from pathlib import Path
 
+import numpy as np
 import torch
 
 from unspoken import exceptions
-from unspoken.enitites.diarization import DiarizationResult
+from unspoken.enitites.diarization import SpeakerHints, DiarizationResult
+from unspoken.enitites.enums.annotation_strategy import AnnotationStrategy
+from unspoken.enitites.enums.decoding_preset import DecodingPreset
+from unspoken.enitites.enums.task_stage import TaskStage
 from unspoken.enitites.enums.task_status import TaskStatus
-from unspoken.enitites.speach_to_text import SpeachToTextResult
-from unspoken.enitites.transcription import TranscriptionResult
+from unspoken.enitites.enums.transcription_mode import TranscriptionMode
+from unspoken.enitites.enums.transcription_model import TranscriptionModel
+from unspoken.enitites.speach_to_text import SpeachToTextResult, SpeachToTextSegment
+from unspoken.enitites.transcription import TranscriptionResult, TranscriptionSegment
 from unspoken.services import db
-from unspoken.services.annotation.annotate_transcription import annotate, annotate_dtw
-from unspoken.services.audio.converter import convert_to_wav
+from unspoken.services.annotation.annotate_transcription import annotate, annotate_dtw, annotate_words
+from unspoken.services.annotation.speaker_turns import merge_speaker_turns
+from unspoken.services.audio.converter import SAMPLE_RATE, decode_audio
+from unspoken.services.audio.vad import SpeechMap, detect_speech
 from unspoken.services.ml.pyanote_diarizer import PyanoteDiarizer
 from unspoken.services.ml.transcriber import Transcriber
-from unspoken.core.loader import prepare_models
+from unspoken.core.device import is_cuda
+from unspoken.core.loader import prepare_models, get_enabled_models
+from unspoken.core.model_registry import model_registry
+from unspoken.services.staged_executor import Stage, StagedExecutor
+from unspoken.settings import settings
 
 logger = logging.getLogger('uvicorn')
 
 
 def clear_cuda_cache(func):
     def wrapper(*args, **kwargs):
+        if not is_cuda():
+            return func(*args, **kwargs)
+
         torch.cuda.empty_cache()
 
         result = func(*args, **kwargs)
@@ -31,20 +51,68 @@ def clear_cuda_cache(func):
     return wrapper
 
 
-def _convert_audio(source_file_data: bytes):
-    wav_data = convert_to_wav(source_file_data)
-    return wav_data
+def _convert_audio(source_path: Path, duration: float | None = None) -> np.ndarray:
+    audio = decode_audio(source_path, duration=duration)
+    return audio
 
 
 @clear_cuda_cache
-def _transcribe_audio(wav_data: bytes) -> SpeachToTextResult:
-    result = Transcriber().transcribe(wav_data)
+def _transcribe_audio(
+    audio: np.ndarray,
+    should_stop: Callable[[], bool] | None = None,
+    on_segment: Callable[[SpeachToTextSegment], None] | None = None,
+    preset: DecodingPreset = DecodingPreset.accurate,
+    model: TranscriptionModel | None = None,
+) -> SpeachToTextResult:
+    with model_registry.acquire(Transcriber, model or settings.transcription_model) as transcriber:
+        result = transcriber.transcribe(audio, should_stop=should_stop, on_segment=on_segment, preset=preset)
     return result
 
 
 @clear_cuda_cache
-def _diarize_audio(wav_data: bytes) -> DiarizationResult:
-    result = PyanoteDiarizer().diarize(wav_data)
+def _transcribe_turns(
+    audio: np.ndarray,
+    diarization_result: DiarizationResult,
+    should_stop: Callable[[], bool] | None = None,
+    on_segment: Callable[[SpeachToTextSegment], None] | None = None,
+    preset: DecodingPreset = DecodingPreset.accurate,
+    model: TranscriptionModel | None = None,
+) -> tuple[SpeachToTextResult, TranscriptionResult]:
+    """Transcribe speaker turns separately, every message takes the speaker of its turn."""
+    turns = merge_speaker_turns(
+        diarization_result.segments,
+        max_duration=settings.turn_max_duration,
+        max_gap=settings.turn_max_gap,
+    )
+    stt_result = SpeachToTextResult()
+    annotated_transcription = TranscriptionResult()
+    with model_registry.acquire(Transcriber, model or settings.transcription_model) as transcriber:
+        turn_results = transcriber.transcribe_turns(
+            audio,
+            turns,
+            should_stop=should_stop,
+            on_segment=on_segment,
+            preset=preset,
+        )
+    for turn, turn_result in zip(turns, turn_results):
+        for segment in turn_result.segments:
+            segment.id = len(stt_result.segments) + 1
+            stt_result.segments.append(segment)
+            annotated_transcription.messages.append(
+                TranscriptionSegment(
+                    speaker=turn.speaker,
+                    start=segment.start,
+                    end=segment.end,
+                    text=segment.text,
+                )
+            )
+    return stt_result, annotated_transcription
+
+
+@clear_cuda_cache
+def _diarize_audio(audio: np.ndarray, hints: SpeakerHints | None = None) -> DiarizationResult:
+    with model_registry.acquire(PyanoteDiarizer) as diarizer:
+        result = diarizer.diarize(audio, hints)
     return result
 
 
@@ -52,16 +120,74 @@ def annotate_transcription(
     stt_result: SpeachToTextResult,
     diarization_result: DiarizationResult,
 ) -> TranscriptionResult:
-    return annotate_dtw(stt_result, diarization_result)
-    return annotate(stt_result, diarization_result)
+    if settings.annotation_strategy == AnnotationStrategy.overlap:
+        return annotate(stt_result, diarization_result)
+    if settings.annotation_strategy == AnnotationStrategy.word:
+        return annotate_words(stt_result, diarization_result)
+    return annotate_dtw(stt_result, diarization_result, band=settings.annotation_dtw_band or None)
+
+
+class _PartialTranscript:
+    """
+    Saves transcribed segments to the database in small batches while transcription is still running.
+
+    Diarization is already done at this point, so every message gets its speaker right away.
+    """
+
+    def __init__(self, task_id: int, duration: float, diarization_result: DiarizationResult):
+        self._task_id = task_id
+        self._duration = duration
+        self._diarization_result = diarization_result
+        self._speakers: dict[str, int] | None = None
+        self._pending: list[SpeachToTextSegment] = []
+        self._flushed_at = time.monotonic()
+
+    def add(self, segment: SpeachToTextSegment) -> None:
+        self._pending.append(segment)
+        if (
+            len(self._pending) >= settings.partial_flush_segments
+            or time.monotonic() - self._flushed_at >= settings.partial_flush_interval
+        ):
+            self.flush()
 
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        segments, self._pending = self._pending, []
+        self._flushed_at = time.monotonic()
+        progress = round(min(segments[-1].end / self._duration, 1.0) * 100, 1) if self._duration else None
+        try:
+            annotated = annotate(SpeachToTextResult(segments=segments), self._diarization_result)
+            with db.Session() as session:
+                if self._speakers is None:
+                    self._speakers = {
+                        speaker: db.create_speaker(name=speaker, task_id=self._task_id, session=session).id
+                        for speaker in self._diarization_result.speakers
+                    }
+                messages = [
+                    db.Message(
+                        speaker_id=self._speakers.get(message.speaker),
+                        task_id=self._task_id,
+                        text=message.text,
+                        start_time=message.start,
+                        end_time=message.end,
+                    )
+                    for message in annotated.messages
+                ]
+                db.save_task_progress(self._task_id, messages, progress, session=session)
+            logger.info('Saved %s partial messages for task %s, progress %s%%.', len(messages), self._task_id, progress)
+        except Exception:
+            # Partial results are a convenience, the complete result is saved at the end anyway.
+            logger.exception('Unable to save partial messages for task %s.', self._task_id)
 
-def _save_to_database(
+
+def save_task_results(
     task_id: int,
     annotated_transcription: TranscriptionResult,
     diarization_result: DiarizationResult,
     transcription_result: SpeachToTextResult,
 ) -> None:
+    """Store the results of a task, its messages and speakers replace the ones saved before."""
     with db.Session() as session:
         task = db.get_task(task_id, session)
         if not task:
@@ -82,6 +208,7 @@ def _save_to_database(
             result=transcription_result.model_dump(),
             session=session,
         )
+        db.delete_task_results(task.id, session=session)
         logger.info('Saving speakers to database.')
         speakers = dict()
         for speaker in diarization_result.speakers:
@@ -111,44 +238,239 @@ def _save_to_database(
     logger.info('Saved %s messages.', len(messages_to_save))
 
 
-def transcribe_audio_flow(temp_file_id: int, task_id: int):
+@dataclasses.dataclass
+class _FlowState:
+    temp_file_id: int
+    task_id: int
+    temp_file: db.TempFile | None = None
+    task: db.Task | None = None
+    preset: DecodingPreset = DecodingPreset.accurate
+    model: TranscriptionModel = settings.transcription_model
+    speaker_hints: SpeakerHints = dataclasses.field(default_factory=SpeakerHints)
+    audio: np.ndarray | None = None
+    # Set when silence was cut out of ``audio``, results are mapped back to the recording with it.
+    speech_map: SpeechMap | None = None
+    diarization: DiarizationResult | None = None
+    transcription: SpeachToTextResult | None = None
+    annotation: TranscriptionResult | None = None
+    cancel_checked_at: float = 0.0
+
+    def is_cancelled(self, throttle: bool = False) -> bool:
+        now = time.monotonic()
+        if throttle and now - self.cancel_checked_at < settings.cancel_check_interval:
+            return False
+        self.cancel_checked_at = now
+        return db.get_task_status(self.task_id) == TaskStatus.cancelled
+
+    def should_stop(self) -> bool:
+        return self.is_cancelled(throttle=True)
+
+    def raise_if_cancelled(self) -> None:
+        if self.is_cancelled():
+            logger.info('Task %s was cancelled, stopping.', self.task_id)
+            raise exceptions.TaskCancelledError(f'Task {self.task_id} was cancelled.')
+
+
+def _prepare_stage(state: _FlowState) -> None:
+    logger.info('Starting transcription flow for task %s.', state.task_id)
+    state.raise_if_cancelled()
+    state.temp_file = db.get_temp_file(state.temp_file_id)
+    if not state.temp_file:
+        logger.error('Not found temporary file with id: %s.', state.temp_file_id)
+        raise exceptions.TempFileNotFoundError(f'Temp file with id {state.temp_file_id} not found.')
+    state.task = db.get_task(state.task_id)
+    if not state.task:
+        logger.error('Task with id: %s was not found.', state.task_id)
+        raise exceptions.TaskNotFoundError(f'Task with id: {state.task_id} was not found.')
+    # Attributes expire once update_task commits, so the duration and the options are read beforehand.
+    duration = state.task.duration
+    state.preset = state.task.preset or DecodingPreset.accurate
+    state.model = state.task.model or settings.transcription_model
+    state.speaker_hints = SpeakerHints(
+        num_speakers=state.task.num_speakers,
+        min_speakers=state.task.min_speakers,
+        max_speakers=state.task.max_speakers,
+    )
+    if state.model not in get_enabled_models():
+        raise exceptions.ModelNotFound(f'Model {state.model.value} of task {state.task_id} is not enabled.')
+    db.delete_task_results(state.task_id)
+    if not db.set_task_status(
+        state.task_id,
+        TaskStatus.processing,
+        stage=TaskStage.converting,
+        started_at=datetime.datetime.utcnow(),
+        progress=0.0,
+    ):
+        raise exceptions.TaskCancelledError(f'Task {state.task_id} was cancelled.')
+    logger.info('Converting audio for tmp_file_id %s.', state.temp_file_id)
+    state.audio = _convert_audio(source_path=state.temp_file.path, duration=duration)
+    if settings.vad_prefilter:
+        _remove_silence(state)
+
+
+def _remove_silence(state: _FlowState) -> None:
+    speech_map = detect_speech(state.audio, settings.vad_min_silence, settings.vad_speech_pad)
+    if not speech_map.speech_duration:
+        logger.info('No speech found for task_id %s, keeping the whole recording.', state.task_id)
+        return
+    logger.info(
+        'Kept %.1f s of speech out of %.1f s for task_id %s.',
+        speech_map.speech_duration,
+        speech_map.duration,
+        state.task_id,
+    )
+    state.speech_map = speech_map
+    state.audio = speech_map.compact(state.audio)
+
+
+def _inference_stage(state: _FlowState) -> None:
+    state.raise_if_cancelled()
+    logger.info('Diarizing audio for task_id %s.', state.task_id)
+    db.update_task(state.task, stage=TaskStage.diarizing)
+    diarization = _diarize_audio(state.audio, state.speaker_hints)
+    speech_map = state.speech_map
+    state.diarization = speech_map.remap_diarization(diarization) if speech_map else diarization
+    state.raise_if_cancelled()
+    logger.info(
+        'Transcribing audio for task_id %s with %s and the %s preset.',
+        state.task_id,
+        state.model.value,
+        state.preset.value,
+    )
+    db.update_task(state.task, stage=TaskStage.transcribing)
+    duration = speech_map.duration if speech_map else len(state.audio) / SAMPLE_RATE
+    partial = _PartialTranscript(state.task_id, duration, state.diarization)
+    on_segment = (lambda segment: partial.add(speech_map.remap_segment(segment))) if speech_map else partial.add
+    if settings.transcription_mode == TranscriptionMode.turns:
+        # Turns are cut from the compacted audio, so they come from the diarization before remapping.
+        state.transcription, state.annotation = _transcribe_turns(
+            state.audio,
+            diarization,
+            should_stop=state.should_stop,
+            on_segment=on_segment,
+            preset=state.preset,
+            model=state.model,
+        )
+        if speech_map:
+            state.annotation = speech_map.remap_annotation(state.annotation)
+    else:
+        state.transcription = _transcribe_audio(
+            state.audio,
+            should_stop=state.should_stop,
+            on_segment=on_segment,
+            preset=state.preset,
+            model=state.model,
+        )
+    if speech_map:
+        state.transcription = speech_map.remap_transcription(state.transcription)
+    partial.flush()
+    state.audio = None
+
+
+def _finalize_stage(state: _FlowState) -> None:
+    state.raise_if_cancelled()
+    db.update_task(state.task, stage=TaskStage.saving)
+    annotated_transcription = state.annotation
+    if annotated_transcription is None:
+        logger.info('Combining results for task_id %s.', state.task_id)
+        annotated_transcription = annotate_transcription(
+            stt_result=state.transcription,
+            diarization_result=state.diarization,
+        )
+    logger.info('Saving results for task_id %s.', state.task_id)
+    save_task_results(
+        task_id=state.task_id,
+        annotated_transcription=annotated_transcription,
+        diarization_result=state.diarization,
+        transcription_result=state.transcription,
+    )
+    if not db.set_task_status(
+        state.task_id,
+        TaskStatus.completed,
+        finished_at=datetime.datetime.utcnow(),
+        progress=100.0,
+    ):
+        # Cancelled while the results were being saved, the task stays cancelled.
+        raise exceptions.TaskCancelledError(f'Task {state.task_id} was cancelled.')
+    logger.info('Transcription flow completed for task %s.', state.task_id)
+
+
+def _complete_flow(state: _FlowState, error: BaseException | None) -> None:
+    try:
+        if isinstance(error, exceptions.TaskCancelledError):
+            logger.info('Transcription flow cancelled for task %s.', state.task_id)
+        elif error is not None and state.task:
+            logger.error('Exception occurred during running transcription flow for task %s.', state.task_id)
+            db.set_task_status(state.task_id, TaskStatus.failed)
+    finally:
+        if state.temp_file:
+            state.temp_file.delete()
+
+
+_STAGES = (_prepare_stage, _inference_stage, _finalize_stage)
+
+
+def warm_up_clip(duration: float = 3.0) -> np.ndarray:
+    """A few seconds of a voiced tone with noise, enough to run every model end to end."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    tone = sum(np.sin(2 * np.pi * 150 * harmonic * t) / harmonic for harmonic in range(1, 6))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    audio = 0.1 * tone * envelope + 0.01 * rng.standard_normal(len(t))
+    return audio.astype(np.float32)
+
 
+def warm_up_models() -> None:
+    """
+    Verify and load the models once per worker and run them on a short clip.
+
+    The first inference allocates buffers and picks kernels, so doing it here keeps that time out of the first task.
+    """
+    start_time = time.time()
     logger.info('Initializing models.')
     prepare_models()
-    logger.info('Models initialized.')
-
-    logger.info('Starting transcription flow for task %s.', task_id)
-    temp_file = db.get_temp_file(temp_file_id)
-    if not temp_file:
-        logger.error('Not found temporary file with id: %s.', temp_file_id)
-        raise exceptions.TempFileNotFoundError(f'Temp file with id {temp_file_id} not found.')
-    task = db.get_task(task_id)
-    if not task:
-        logger.error('Task with id: %s was not found.', task_id)
-        temp_file.delete()
-        raise exceptions.TaskNotFoundError(f'Task with id: {task_id} was not found.')
+    logger.info('Warming up models.')
+    audio = warm_up_clip()
+    _diarize_audio(audio)
+    _transcribe_audio(audio)
+    logger.info('Models warmed up in %.3f seconds.', time.time() - start_time)
+
+
+def resident_models() -> list[TranscriptionModel]:
+    """Transcription models currently loaded in this process."""
+    return [args[0] for cls, args in model_registry.loaded() if cls is Transcriber]
+
+
+def transcribe_audio_flow(temp_file_id: int, task_id: int):
+    state = _FlowState(temp_file_id=temp_file_id, task_id=task_id)
     try:
-        db.update_task(task, status=TaskStatus.processing)
-        logger.info('Converting audio for tmp_file_id %s.', temp_file_id)
-        wav_data = _convert_audio(source_file_data=temp_file.read())
-        logger.info('Diarizing audio for task_id %s.', task_id)
-        diarization = _diarize_audio(wav_data)
-        logger.info('Transcribing audio for task_id %s.', task_id)
-        transcription = _transcribe_audio(wav_data)
-        logger.info('Combining results for task_id %s.', task_id)
-        annotated_transcription = annotate_transcription(stt_result=transcription, diarization_result=diarization)
-        logger.info('Saving results for task_id %s.', task_id)
-        _save_to_database(
-            task_id=task_id,
-            annotated_transcription=annotated_transcription,
-            diarization_result=diarization,
-            transcription_result=transcription,
-        )
-        db.update_task(task, status=TaskStatus.completed)
-        logger.info('Transcription flow completed for task %s.', task_id)
-    except Exception:
+        for stage in _STAGES:
+            stage(state)
+    except exceptions.TaskCancelledError as e:
+        _complete_flow(state, e)
+        raise
+    except Exception as e:
         logger.exception('Exception occurred during running transcription flow.')
-        db.update_task(task, status=TaskStatus.failed)
+        _complete_flow(state, e)
         raise
-    finally:
-        temp_file.delete()
+    _complete_flow(state, None)
+
+
+def build_transcribe_executor() -> StagedExecutor:
+    """
+    Build a pipelined variant of ``transcribe_audio_flow``.
+
+    Conversion of the next task and saving of the previous one run on their own threads while the
+    models work on the current task.
+    """
+    return StagedExecutor(
+        stages=[
+            Stage('prepare', _prepare_stage, concurrency=settings.pipeline_prepare_workers),
+            Stage('inference', _inference_stage, concurrency=1),
+            Stage('finalize', _finalize_stage, concurrency=settings.pipeline_finalize_workers),
+        ],
+        make_payload=_FlowState,
+        on_complete=_complete_flow,
+        queue_size=settings.pipeline_queue_size,
+        expected_errors=(exceptions.TaskCancelledError,),
+    )
@@ -1,19 +1,86 @@
 import time
 import logging
+import warnings
 from pathlib import Path
-from tempfile import NamedTemporaryFile
 
+import numpy as np
 import torch
 from pyannote.audio import Pipeline
+from pyannote.audio.utils.signal import binarize
+from pyannote.core import Annotation, SlidingWindowFeature
 from pyannote.audio.pipelines.speaker_diarization import SpeakerDiarization
 
 from unspoken.core.device import get_device
-from unspoken.enitites.diarization import SpeakerSegment, DiarizationResult
+from unspoken.enitites.diarization import SpeakerHints, SpeakerSegment, DiarizationResult
 from unspoken.enitites.enums.ml_models import Model
+from unspoken.services.audio.converter import SAMPLE_RATE
 from unspoken.services.ml.base_diarizer import BaseDiarizer
+from unspoken.services.ml.speaker_centroids import SpeakerCentroids
+from unspoken.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Shorter speech does not give a reliable embedding.
+_MIN_EMBEDDING_DURATION = 1.0
+
+
+def _is_usable(embedding: np.ndarray | None) -> bool:
+    if embedding is None:
+        return False
+    norm = np.linalg.norm(embedding)
+    return bool(np.isfinite(norm) and norm > 0)
+
+
+class _SpeakerDiarization(SpeakerDiarization):
+    """
+    Speaker diarization that skips embeddings and clustering when segmentation hears a single speaker.
+
+    Segmentation chunks overlap, so every change of speakers ends up inside some chunk, which then has more than
+    one active local speaker. When no chunk has, the whole file is one speaker. Speakers separated by a pause
+    longer than a chunk are the exception and get merged.
+    """
+
+    def get_segmentations(self, file, hook=None) -> SlidingWindowFeature:
+        if self.CACHED_SEGMENTATION in file:
+            return file[self.CACHED_SEGMENTATION]
+        return super().get_segmentations(file, hook=hook)
+
+    def _local_speakers(self, segmentations: SlidingWindowFeature) -> int:
+        """Largest number of speakers active in one chunk."""
+        if not self._segmentation.model.specifications.powerset:
+            segmentations = binarize(segmentations, onset=self.segmentation.threshold, initial_state=False)
+        return int(np.max(np.sum(np.nanmax(segmentations.data, axis=1) > 0, axis=1), initial=0))
+
+    def apply(
+        self,
+        file,
+        num_speakers: int | None = None,
+        min_speakers: int | None = None,
+        max_speakers: int | None = None,
+        return_embeddings: bool = False,
+        hook=None,
+    ):
+        if (
+            settings.diarization_single_speaker_check
+            and not return_embeddings
+            and num_speakers is None
+            and (min_speakers or 1) <= 1
+            and (max_speakers is None or max_speakers > 1)
+        ):
+            # The segmentation is kept in the file, so the pipeline does not compute it again.
+            file[self.CACHED_SEGMENTATION] = self.get_segmentations(file)
+            if self._local_speakers(file[self.CACHED_SEGMENTATION]) <= 1:
+                logger.info('Segmentation found a single speaker, skipping embeddings.')
+                max_speakers = 1
+        return super().apply(
+            file,
+            num_speakers=num_speakers,
+            min_speakers=min_speakers,
+            max_speakers=max_speakers,
+            return_embeddings=return_embeddings,
+            hook=hook,
+        )
+
 
 class _Pipeline(Pipeline):
     @classmethod
@@ -21,7 +88,7 @@ class _Pipeline(Pipeline):
         path_segmentation_model = str(Path(model_path) / 'segmentation_checkpoint.bin')
         path_embedding_model = str(Path(model_path) / 'embedding_checkpoint.bin')
 
-        pipeline = SpeakerDiarization(
+        pipeline = _SpeakerDiarization(
             segmentation_batch_size=32,
             embedding_batch_size=32,
             embedding_exclude_overlap=True,
@@ -50,26 +117,141 @@ class PyanoteDiarizer(BaseDiarizer):
         self._pipeline = _Pipeline.from_pretrained(
             Model.diarization.path(),
         ).to(get_device())
+        self.memory_size = Model.diarization.size()
 
     @torch.inference_mode()
-    def diarize(self, wav_data: bytes) -> DiarizationResult:
+    def embed(self, audio: np.ndarray) -> np.ndarray:
+        """Compute the speaker embedding of a clip with a single speaker."""
+        waveform = torch.from_numpy(np.array(audio, dtype=np.float32))[None, None]
+        return self._pipeline._embedding(waveform)[0]
+
+    def _run(self, audio: np.ndarray, hints: SpeakerHints, return_embeddings: bool = False):
+        with warnings.catch_warnings():
+            # The waveform is shared read-only with the transcriber, pyannote never writes into it.
+            warnings.filterwarnings('ignore', message='The given NumPy array is not writable')
+            waveform = torch.from_numpy(audio).unsqueeze(0)
+        return self._pipeline(
+            {'waveform': waveform, 'sample_rate': SAMPLE_RATE},
+            return_embeddings=return_embeddings,
+            **hints.model_dump(),
+        )
+
+    def _window_embeddings(
+        self,
+        audio: np.ndarray,
+        diarization: Annotation,
+        embeddings: np.ndarray | None,
+    ) -> dict[str, np.ndarray]:
+        """
+        Usable embedding of every speaker of a window.
+
+        Pyannote pads the centroids of speakers that clustering did not produce with zeros, the embeddings of
+        those speakers are computed from their own speech instead. Speakers with too little speech for that
+        are left out.
+        """
+        result = {}
+        for index, label in enumerate(diarization.labels()):
+            embedding = embeddings[index] if embeddings is not None and index < len(embeddings) else None
+            if not _is_usable(embedding) and diarization.label_duration(label) >= _MIN_EMBEDDING_DURATION:
+                clip = np.concatenate(
+                    [
+                        audio[int(segment.start * SAMPLE_RATE) : int(segment.end * SAMPLE_RATE)]
+                        for segment in diarization.label_timeline(label).support()
+                    ]
+                )
+                embedding = self.embed(clip)
+            if _is_usable(embedding):
+                result[label] = embedding
+        return result
+
+    def _diarize_windowed(
+        self,
+        audio: np.ndarray,
+        window: int,
+        overlap: int,
+        hints: SpeakerHints,
+    ) -> list[tuple[float, float, str]]:
+        """
+        Diarize audio in overlapping windows and stitch speakers across windows by embedding similarity.
+
+        Only one window is processed at a time and every speaker is kept as a single centroid, so memory
+        does not grow with duration. Every window keeps the segments of its own span, the span borders are
+        in the middle of the overlaps. A window may hear only some of the speakers, so of the hints only
+        the upper bound applies to it. With an upper bound of one there is nothing to stitch, every window
+        gets the same speaker and no embeddings are computed.
+        """
+        window_hints = SpeakerHints(max_speakers=hints.num_speakers or hints.max_speakers)
+        single_speaker = window_hints.max_speakers == 1
+        centroids = SpeakerCentroids(threshold=settings.diarization_speaker_similarity)
+        last_speaker = None
+        step = window - overlap
+        starts = list(range(0, max(len(audio) - overlap, 1), step))
+        tracks = []
+        for index, start in enumerate(starts):
+            end = min(start + window, len(audio))
+            owned_start = 0.0 if index == 0 else (start + overlap / 2) / SAMPLE_RATE
+            owned_end = len(audio) / SAMPLE_RATE if index == len(starts) - 1 else (end - overlap / 2) / SAMPLE_RATE
+            offset = start / SAMPLE_RATE
+            logger.info('Diarizing window %s of %s.', index + 1, len(starts))
+
+            if single_speaker:
+                diarization = self._run(audio[start:end], window_hints)
+                mapping = {label: 'speaker_00' for label in diarization.labels()}
+            else:
+                diarization, embeddings = self._run(audio[start:end], window_hints, return_embeddings=True)
+                labels = diarization.labels()
+                durations = {label: diarization.label_duration(label) for label in labels}
+                mapping = centroids.match(
+                    embeddings=self._window_embeddings(audio[start:end], diarization, embeddings),
+                    weights=durations,
+                )
+                if len(mapping) < len(labels):
+                    # Speakers without an embedding can not be told apart, they go to the main speaker around them.
+                    main = max(mapping, key=durations.get) if mapping else None
+                    fallback = mapping[main] if main else last_speaker or centroids.add_unknown()
+                    for label in labels:
+                        mapping.setdefault(label, fallback)
+                if labels:
+                    last_speaker = mapping[max(labels, key=durations.get)]
+            for segment, _, speaker in diarization.itertracks(yield_label=True):
+                segment_start = max(segment.start + offset, owned_start)
+                segment_end = min(segment.end + offset, owned_end)
+                if segment_start < segment_end:
+                    tracks.append((segment_start, segment_end, mapping[speaker]))
+        return sorted(tracks)
+
+    @torch.inference_mode()
+    def diarize(self, audio: np.ndarray, hints: SpeakerHints | None = None) -> DiarizationResult:
+        """
+        Recordings longer than ``settings.diarization_window`` seconds are diarized in windows. Windowing is
+        off by default, set the window to bound memory on very long recordings at some cost in accuracy.
+
+        :param audio: Waveform to diarize.
+        :param hints: Known number of speakers or its bounds.
+        """
         start_time = time.time()
-        with NamedTemporaryFile(suffix='.wav') as fp:
-            fp.write(wav_data)
-            fp.flush()
-            diarization = self._pipeline(fp.name)
+        hints = hints or SpeakerHints()
+        window = int(settings.diarization_window * SAMPLE_RATE)
+        overlap = int(settings.diarization_window_overlap * SAMPLE_RATE)
+        if window and len(audio) > window:
+            tracks = self._diarize_windowed(audio, window, min(overlap, window // 2), hints)
+        else:
+            tracks = [
+                (segment.start, segment.end, speaker)
+                for segment, _, speaker in self._run(audio, hints).itertracks(yield_label=True)
+            ]
 
         result = DiarizationResult()
         speakers = set()
-        for id_, (segment, _, speaker) in enumerate(diarization.itertracks(yield_label=True)):
+        for id_, (start, end, speaker) in enumerate(tracks):
             speakers.add(speaker.lower())
             result.segments.append(
                 SpeakerSegment(
                     id=id_,
-                    start=float(round(segment.start, 3)),
-                    end=float(round(segment.end, 3)),
+                    start=float(round(start, 3)),
+                    end=float(round(end, 3)),
                     speaker=speaker.lower(),
-                    duration=float(round(segment.duration, 3)),
+                    duration=float(round(end - start, 3)),
                 )
             )
         result.speakers = list(speakers)
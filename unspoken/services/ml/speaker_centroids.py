@@ -0,0 +1,89 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SpeakerCentroids:
+    """
+    Running speaker centroids used to keep speaker labels consistent between independently diarized parts of audio.
+
+    Every known speaker is kept as one normalized embedding, the weighted mean of all embeddings matched to it,
+    so memory depends on the number of speakers only.
+    """
+
+    def __init__(self, threshold: float, label_format: str = 'speaker_{:02d}'):
+        """
+        :param threshold: Minimal cosine similarity to consider two embeddings the same speaker.
+        :param label_format: Format of the labels given to new speakers, receives the speaker index.
+        """
+        self._threshold = threshold
+        self._label_format = label_format
+        self._labels: list[str] = []
+        self._sums: list[np.ndarray] = []
+        self._weights: list[float] = []
+
+    @property
+    def labels(self) -> list[str]:
+        return list(self._labels)
+
+    def _centroids(self, indices: list[int]) -> np.ndarray:
+        centroids = np.stack([self._sums[index] for index in indices])
+        return centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+
+    def _add(self, embedding: np.ndarray, weight: float) -> str:
+        label = self._label_format.format(len(self._labels))
+        self._labels.append(label)
+        self._sums.append(embedding * weight)
+        self._weights.append(weight)
+        return label
+
+    def add_unknown(self) -> str:
+        """Register a speaker without an embedding, it gets a label of its own but is never matched."""
+        return self._add(np.zeros(1), 0.0)
+
+    def match(self, embeddings: dict[str, np.ndarray], weights: dict[str, float] | None = None) -> dict[str, str]:
+        """
+        Map local speakers to global labels, creating new speakers for those that match nobody.
+
+        Pairs are matched greedily by similarity, so two local speakers never get the same global label.
+
+        :param embeddings: Embedding of every local speaker.
+        :param weights: Weight of every local speaker in the centroid update, usually its speech duration.
+        :return: Global label of every local speaker.
+        """
+        weights = weights or {}
+        mapping = {}
+        local = []
+        for speaker, embedding in embeddings.items():
+            norm = np.linalg.norm(embedding)
+            if not np.isfinite(norm) or norm == 0:
+                # Speakers without a usable embedding can not be compared with anybody.
+                mapping[speaker] = self._add(np.zeros_like(embedding), 0.0)
+                continue
+            local.append((speaker, embedding / norm))
+
+        candidates = []
+        known = [index for index, weight in enumerate(self._weights) if weight > 0]
+        if local and known:
+            similarities = np.stack([embedding for _, embedding in local]) @ self._centroids(known).T
+            for row, column in zip(*np.nonzero(similarities >= self._threshold)):
+                candidates.append((similarities[row, column], row, known[column]))
+
+        used = set()
+        for similarity, row, index in sorted(candidates, reverse=True):
+            speaker, embedding = local[row]
+            if speaker in mapping or index in used:
+                continue
+            used.add(index)
+            weight = weights.get(speaker, 1.0)
+            self._sums[index] = self._sums[index] + embedding * weight
+            self._weights[index] += weight
+            mapping[speaker] = self._labels[index]
+            logger.debug('Matched speaker %s to %s with similarity %.3f', speaker, self._labels[index], similarity)
+
+        for speaker, embedding in local:
+            if speaker not in mapping:
+                mapping[speaker] = self._add(embedding, weights.get(speaker, 1.0))
+        return mapping
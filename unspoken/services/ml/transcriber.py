@@ -1,49 +1,333 @@
 import logging
 import time
-from io import BytesIO
+import dataclasses
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
 
+import ctranslate2
+import numpy as np
 import torch
 from faster_whisper import WhisperModel
+from faster_whisper.tokenizer import Tokenizer
+from faster_whisper.vad import VadOptions, get_speech_timestamps
 
-from unspoken.core.singleton import SingletonMeta
+from unspoken.core.device import is_cuda, get_cpu_threads, get_compute_type
+from unspoken.enitites.diarization import SpeakerSegment
+from unspoken.enitites.enums.decoding_preset import DecodingPreset
 from unspoken.enitites.enums.ml_models import Model
-from unspoken.enitites.speach_to_text import SpeachToTextResult, SpeachToTextSegment
+from unspoken.enitites.enums.transcription_mode import TranscriptionMode
+from unspoken.enitites.enums.transcription_model import TranscriptionModel
+from unspoken.enitites.speach_to_text import SpeachToTextWord, SpeachToTextResult, SpeachToTextSegment
+from unspoken.exceptions import TaskCancelledError
 from unspoken.settings import settings
 
 logger = logging.getLogger(__name__)
 
+LANGUAGE = 'ru'
+BEAM_SIZE = 5
+NO_SPEECH_THRESHOLD = 0.6
+LOG_PROB_THRESHOLD = -1.0
 
-class Transcriber(metaclass=SingletonMeta):
-    def __init__(self):
+
+@dataclasses.dataclass(frozen=True)
+class DecodingOptions:
+    beam_size: int
+    best_of: int
+    # Temperatures tried in turn while the output fails the compression ratio or log probability checks.
+    temperature: tuple[float, ...]
+    word_timestamps: bool
+    condition_on_previous_text: bool
+
+
+DECODING_PRESETS = {
+    DecodingPreset.fast: DecodingOptions(
+        beam_size=1,
+        best_of=1,
+        temperature=(0.0,),
+        word_timestamps=False,
+        condition_on_previous_text=False,
+    ),
+    DecodingPreset.balanced: DecodingOptions(
+        beam_size=2,
+        best_of=2,
+        temperature=(0.0, 0.4, 0.8),
+        word_timestamps=False,
+        condition_on_previous_text=True,
+    ),
+    DecodingPreset.accurate: DecodingOptions(
+        beam_size=BEAM_SIZE,
+        best_of=5,
+        temperature=(0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        word_timestamps=True,
+        condition_on_previous_text=True,
+    ),
+}
+
+
+class Transcriber:
+    def __init__(self, model: TranscriptionModel):
+        num_workers = settings.turn_workers if settings.transcription_mode == TranscriptionMode.turns else 1
         self._model = WhisperModel(
-            model_size_or_path=Model.large_v3.path(),
-            device=settings.device,
+            model_size_or_path=Model(model.value).path(),
+            device='cuda' if is_cuda() else 'cpu',
             device_index=settings.device_index,
-            compute_type=settings.compute_type,
+            compute_type=get_compute_type(),
+            # Every worker of the model runs its own threads, together they should not exceed the cores given.
+            cpu_threads=max(1, get_cpu_threads() // num_workers),
+            num_workers=num_workers,
             download_root=settings.models_dir_path,
         )
+        # CTranslate2 allocates the weights outside of torch, on a GPU they do not show in the measured memory.
+        self.memory_size = Model(model.value).size()
 
     @torch.inference_mode()
-    def transcribe(self, audio: bytes) -> SpeachToTextResult:
+    def transcribe(
+        self,
+        audio: np.ndarray,
+        should_stop: Callable[[], bool] | None = None,
+        on_segment: Callable[[SpeachToTextSegment], None] | None = None,
+        preset: DecodingPreset = DecodingPreset.accurate,
+    ) -> SpeachToTextResult:
         start_time = time.time()
+        options = DECODING_PRESETS[preset]
+        if settings.transcription_mode == TranscriptionMode.batched:
+            result = self._transcribe_batched(audio, should_stop, on_segment, options)
+        else:
+            result = self._transcribe_sequential(audio, should_stop, on_segment, options)
+        end_time = time.time()
+        diarization_time = end_time - start_time
+        logger.info(f'Transcription completed in {diarization_time:.3f} seconds.')
+        if is_cuda():
+            torch.cuda.empty_cache()
+        return result
+
+    def _transcribe_sequential(
+        self,
+        audio: np.ndarray,
+        should_stop: Callable[[], bool] | None = None,
+        on_segment: Callable[[SpeachToTextSegment], None] | None = None,
+        options: DecodingOptions = DECODING_PRESETS[DecodingPreset.accurate],
+    ) -> SpeachToTextResult:
         segments, info = self._model.transcribe(
-            BytesIO(audio),
-            language='ru',
+            audio,
+            language=LANGUAGE,
             task='transcribe',
-            word_timestamps=True,
+            **dataclasses.asdict(options),
         )
         result = SpeachToTextResult()
         for segment in segments:
+            if should_stop and should_stop():
+                raise TaskCancelledError('Transcription was stopped.')
             result.segments.append(
                 SpeachToTextSegment(
                     id=segment.id,
                     start=segment.start,
                     end=segment.end,
                     text=segment.text.strip(),
+                    words=[
+                        SpeachToTextWord(start=word.start, end=word.end, text=word.word) for word in segment.words or []
+                    ],
                 )
             )
-        end_time = time.time()
-        diarization_time = end_time - start_time
-        logger.info(f'Transcription completed in {diarization_time:.3f} seconds.')
-        torch.cuda.empty_cache()
+            if on_segment:
+                on_segment(result.segments[-1])
+        return result
+
+    @torch.inference_mode()
+    def transcribe_clip(self, audio: np.ndarray, offset: float = 0.0, beam_size: int = BEAM_SIZE) -> SpeachToTextResult:
+        """
+        Transcribe a short clip independently of the audio around it.
+
+        :param audio: Waveform of the clip, it should fit into the 30 s model window.
+        :param offset: Start of the clip in seconds, added to all timestamps.
+        :param beam_size: Beam size, 1 gives greedy decoding for quick interim results.
+        :return: Segments of the clip with absolute timestamps, clipped to the clip end.
+        """
+        end = offset + len(audio) / self._model.feature_extractor.sampling_rate
+        segments, info = self._model.transcribe(
+            audio,
+            language=LANGUAGE,
+            task='transcribe',
+            beam_size=beam_size,
+            condition_on_previous_text=False,
+        )
+        result = SpeachToTextResult()
+        for segment in segments:
+            text = segment.text.strip()
+            if text:
+                result.segments.append(
+                    SpeachToTextSegment(
+                        id=segment.id,
+                        start=round(offset + segment.start, 3),
+                        end=round(min(offset + segment.end, end), 3),
+                        text=text,
+                    )
+                )
+        return result
+
+    def _transcribe_turn(self, audio: np.ndarray, turn: SpeakerSegment, beam_size: int) -> SpeachToTextResult:
+        sampling_rate = self._model.feature_extractor.sampling_rate
+        return self.transcribe_clip(
+            audio[int(turn.start * sampling_rate) : int(turn.end * sampling_rate)],
+            offset=turn.start,
+            beam_size=beam_size,
+        )
+
+    @torch.inference_mode()
+    def transcribe_turns(
+        self,
+        audio: np.ndarray,
+        turns: list[SpeakerSegment],
+        should_stop: Callable[[], bool] | None = None,
+        on_segment: Callable[[SpeachToTextSegment], None] | None = None,
+        preset: DecodingPreset = DecodingPreset.accurate,
+    ) -> list[SpeachToTextResult]:
+        """
+        Transcribe every speaker turn on its own, ``turn_workers`` turns are decoded concurrently.
+
+        :param audio: Waveform of the whole recording.
+        :param turns: Speaker turns, each of them should fit into the 30 s model window.
+        :param should_stop: Called between turns, transcription is cancelled once it returns True.
+        :param on_segment: Called with every transcribed segment, in the order of turns.
+        :param preset: Decoding preset, turns are decoded independently so only its beam size applies.
+        :return: Transcription of every turn in the order of ``turns`` with absolute timestamps.
+        """
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=settings.turn_workers, thread_name_prefix='turn') as executor:
+            beam_size = DECODING_PRESETS[preset].beam_size
+            futures = [executor.submit(self._transcribe_turn, audio, turn, beam_size) for turn in turns]
+            results = []
+            for future in futures:
+                if should_stop and should_stop():
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    raise TaskCancelledError('Transcription was stopped.')
+                results.append(future.result())
+                if on_segment:
+                    for segment in results[-1].segments:
+                        on_segment(segment)
+        logger.info(f'Transcription of {len(turns)} turns completed in {time.time() - start_time:.3f} seconds.')
+        if is_cuda():
+            torch.cuda.empty_cache()
+        return results
+
+    def _speech_chunks(self, audio: np.ndarray) -> list[tuple[int, int]]:
+        """
+        Split audio into independent speech chunks no longer than the 30 s model window.
+
+        Consecutive VAD regions are merged while they fit into one window, so every chunk keeps as much
+        context as possible.
+        """
+        max_samples = self._model.feature_extractor.n_samples
+        speech = get_speech_timestamps(
+            audio,
+            VadOptions(max_speech_duration_s=self._model.feature_extractor.chunk_length, min_silence_duration_ms=160),
+        )
+        chunks = []
+        for region in speech:
+            if chunks and region['end'] - chunks[-1][0] <= max_samples:
+                chunks[-1] = (chunks[-1][0], region['end'])
+            else:
+                chunks.append((region['start'], min(region['end'], region['start'] + max_samples)))
+        return chunks
+
+    def _encode_batch(self, audio: np.ndarray, chunks: list[tuple[int, int]]) -> ctranslate2.StorageView:
+        nb_max_frames = self._model.feature_extractor.nb_max_frames
+        features = np.stack(
+            [self._model.feature_extractor(audio[start:end])[:, :nb_max_frames] for start, end in chunks]
+        )
+        features = ctranslate2.StorageView.from_array(np.ascontiguousarray(features))
+        to_cpu = self._model.model.device == 'cuda' and len(self._model.model.device_index) > 1
+        return self._model.model.encode(features, to_cpu=to_cpu)
+
+    def _split_tokens(
+        self,
+        tokens: list[int],
+        tokenizer: Tokenizer,
+        offset: float,
+        duration: float,
+    ) -> list[tuple[float, float, str]]:
+        """Cut decoded tokens into segments at timestamp tokens and shift them to absolute time."""
+        pieces = []
+        start = 0.0
+        text_tokens = []
+        for token in tokens:
+            if token < tokenizer.timestamp_begin:
+                text_tokens.append(token)
+                continue
+            timestamp = min((token - tokenizer.timestamp_begin) * self._model.time_precision, duration)
+            if text_tokens:
+                pieces.append((start, timestamp, text_tokens))
+                text_tokens = []
+            start = timestamp
+        if text_tokens:
+            pieces.append((start, duration, text_tokens))
+
+        segments = []
+        for start, end, text_tokens in pieces:
+            text = tokenizer.decode(text_tokens).strip()
+            if text:
+                segments.append((offset + start, offset + max(start, end), text))
+        return segments
+
+    def _transcribe_batched(
+        self,
+        audio: np.ndarray,
+        should_stop: Callable[[], bool] | None = None,
+        on_segment: Callable[[SpeachToTextSegment], None] | None = None,
+        options: DecodingOptions = DECODING_PRESETS[DecodingPreset.accurate],
+    ) -> SpeachToTextResult:
+        """
+        Transcribe VAD chunks independently, encoding and decoding ``transcription_batch_size`` of them at once.
+
+        Chunks do not condition on the previous text and there is no temperature fallback, in exchange
+        the encoder and the decoder work on full batches. Only the beam size of the preset applies.
+        """
+        tokenizer = Tokenizer(
+            self._model.hf_tokenizer,
+            self._model.model.is_multilingual,
+            task='transcribe',
+            language=LANGUAGE,
+        )
+        prompt = self._model.get_prompt(tokenizer, previous_tokens=[])
+        sampling_rate = self._model.feature_extractor.sampling_rate
+        chunks = self._speech_chunks(audio)
+        logger.info('Transcribing %s speech chunks in batches of %s.', len(chunks), settings.transcription_batch_size)
+
+        result = SpeachToTextResult()
+        for batch_start in range(0, len(chunks), settings.transcription_batch_size):
+            if should_stop and should_stop():
+                raise TaskCancelledError('Transcription was stopped.')
+            batch = chunks[batch_start : batch_start + settings.transcription_batch_size]
+            encoder_output = self._encode_batch(audio, batch)
+            outputs = self._model.model.generate(
+                encoder_output,
+                [prompt] * len(batch),
+                beam_size=options.beam_size,
+                max_length=self._model.max_length,
+                return_scores=True,
+                return_no_speech_prob=True,
+                suppress_blank=True,
+                suppress_tokens=[-1],
+            )
+            for (start, end), output in zip(batch, outputs):
+                tokens = output.sequences_ids[0]
+                avg_log_prob = output.scores[0] * len(tokens) / (len(tokens) + 1)
+                if output.no_speech_prob > NO_SPEECH_THRESHOLD and avg_log_prob < LOG_PROB_THRESHOLD:
+                    continue
+                for segment_start, segment_end, text in self._split_tokens(
+                    tokens,
+                    tokenizer,
+                    offset=start / sampling_rate,
+                    duration=(end - start) / sampling_rate,
+                ):
+                    result.segments.append(
+                        SpeachToTextSegment(
+                            id=len(result.segments) + 1,
+                            start=round(segment_start, 3),
+                            end=round(segment_end, 3),
+                            text=text,
+                        )
+                    )
+                    if on_segment:
+                        on_segment(result.segments[-1])
         return result
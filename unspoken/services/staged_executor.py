@@ -0,0 +1,139 @@
+import queue
+import logging
+import threading
+import dataclasses
+from typing import Any, Callable
+
+logger = logging.getLogger('uvicorn')
+
+_STOP = object()
+
+
+@dataclasses.dataclass(frozen=True)
+class Stage:
+    name: str
+    func: Callable[[Any], None]
+    concurrency: int = 1
+
+
+@dataclasses.dataclass
+class _WorkItem:
+    payload: Any
+    callback: Callable[[BaseException | None], None] | None
+    holds_slot: bool = True
+
+
+class StagedExecutor:
+    """
+    Runs items through a chain of stages, every stage on its own threads.
+
+    Stages are connected by bounded queues, so a slow stage blocks the stages in front of it instead of
+    letting work pile up in memory. While one item is in a model stage the next item can already be
+    converted and the previous one saved. A slot reserved with ``acquire`` is held until the item moved
+    past the first stage, so new items are only taken in while the first stage has room for them.
+
+    Every stage function receives the payload created by ``make_payload`` and mutates it in place.
+    ``on_complete`` is called with the payload and the exception, if any, once the item left the last
+    stage or failed in one of them. Exceptions listed in ``expected_errors`` stop the item without
+    being logged as errors.
+
+    The executor is picklable until ``start`` is called, so it can be handed to worker processes.
+    """
+
+    def __init__(
+        self,
+        stages: list[Stage],
+        make_payload: Callable[..., Any],
+        on_complete: Callable[[Any, BaseException | None], None],
+        queue_size: int = 1,
+        expected_errors: tuple[type[Exception], ...] = (),
+    ):
+        self._stages = stages
+        self._make_payload = make_payload
+        self._on_complete = on_complete
+        self._queue_size = queue_size
+        self._expected_errors = expected_errors
+        self._queues: list[queue.Queue] = []
+        self._threads: list[threading.Thread] = []
+        self._capacity: threading.Semaphore | None = None
+
+    @property
+    def capacity(self) -> int:
+        return self._stages[0].concurrency + self._queue_size
+
+    def start(self) -> None:
+        self._capacity = threading.Semaphore(self.capacity)
+        self._queues = [queue.Queue(maxsize=self._queue_size) for _ in self._stages]
+        for position, stage in enumerate(self._stages):
+            for index in range(stage.concurrency):
+                thread = threading.Thread(
+                    target=self._run_stage,
+                    args=(position,),
+                    name=f'stage-{stage.name}-{index}',
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        """Reserve a slot for one more item, blocks while the pipeline is full."""
+        return self._capacity.acquire(timeout=timeout)
+
+    def release(self) -> None:
+        """Give back a slot reserved with ``acquire`` that was not used for ``submit``."""
+        self._capacity.release()
+
+    def submit(self, *args, callback: Callable[[BaseException | None], None] | None = None) -> None:
+        """Put an item into the first stage. A slot has to be reserved with ``acquire`` beforehand."""
+        self._queues[0].put(_WorkItem(payload=self._make_payload(*args), callback=callback))
+
+    def stop(self) -> None:
+        """Let the items already submitted run to completion and stop the stage threads."""
+        for position, stage in enumerate(self._stages):
+            for _ in range(stage.concurrency):
+                self._queues[position].put(_STOP)
+            for thread in self._threads:
+                if thread.name.startswith(f'stage-{stage.name}-'):
+                    thread.join()
+
+    def _complete(self, item: _WorkItem, error: BaseException | None) -> None:
+        try:
+            self._on_complete(item.payload, error)
+        except Exception:
+            logger.exception('Error completing pipeline item.')
+            error = error or Exception('Pipeline item completion failed.')
+        finally:
+            self._release_slot(item)
+        if item.callback:
+            item.callback(error)
+
+    def _run_stage(self, position: int) -> None:
+        stage = self._stages[position]
+        is_last = position == len(self._stages) - 1
+        while True:
+            item = self._queues[position].get()
+            if item is _STOP:
+                break
+            try:
+                stage.func(item.payload)
+            except self._expected_errors as e:
+                logger.info('Pipeline item stopped in stage %s: %s', stage.name, e)
+                self._complete(item, e)
+                continue
+            except Exception as e:
+                logger.exception('Error in pipeline stage %s.', stage.name)
+                self._complete(item, e)
+                continue
+            if is_last:
+                self._complete(item, None)
+            elif item.holds_slot:
+                item.holds_slot = False
+                self._queues[position + 1].put(item)
+                self._capacity.release()
+            else:
+                self._queues[position + 1].put(item)
+
+    def _release_slot(self, item: _WorkItem) -> None:
+        if item.holds_slot:
+            item.holds_slot = False
+            self._capacity.release()
@@ -0,0 +1,99 @@
+import json
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+
+import psycopg
+
+from unspoken.services import db
+from unspoken.settings import settings
+
+logger = logging.getLogger('uvicorn')
+
+
+class TaskEventBroker:
+    """
+    Delivers task state changes published with NOTIFY to asyncio subscribers of this process.
+
+    One connection per process listens on ``db.TASK_EVENTS_CHANNEL``, so any number of viewers can follow
+    their tasks without querying the database. Subscribers receive event dicts, or None after the listening
+    connection was re-established and events could have been missed, then the state has to be read again.
+    """
+
+    def __init__(self):
+        self._subscribers: dict[int, set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='task-events', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def subscribe(self, task_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers[task_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, task_id: int, queue: asyncio.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(task_id)
+            if subscribers is None:
+                return
+            subscribers.difference_update({subscriber for subscriber in subscribers if subscriber[1] is queue})
+            if not subscribers:
+                del self._subscribers[task_id]
+
+    def _publish(self, task_ids: list[int] | None, event: dict | None) -> None:
+        with self._lock:
+            if task_ids is None:
+                task_ids = list(self._subscribers)
+            subscribers = [subscriber for task_id in task_ids for subscriber in self._subscribers.get(task_id, ())]
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The event loop of the subscriber is already closed.
+                pass
+
+    def _dispatch(self, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+            task_id = int(event['task_id'])
+        except (ValueError, KeyError, TypeError):
+            logger.warning('Ignoring malformed task event %s', payload)
+            return
+        self._publish([task_id], event)
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                with psycopg.connect(
+                    host=settings.db_host,
+                    port=settings.db_port,
+                    dbname=settings.db_name,
+                    user=settings.db_user,
+                    password=settings.db_password,
+                    autocommit=True,
+                ) as connection:
+                    connection.execute(f'LISTEN {db.TASK_EVENTS_CHANNEL}')
+                    logger.info('Listening for task events.')
+                    self._publish(None, None)
+                    while not self._stop_event.is_set():
+                        for notify in connection.notifies(timeout=1.0):
+                            self._dispatch(notify.payload)
+            except psycopg.Error:
+                logger.exception('Task events connection failed, reconnecting.')
+                self._stop_event.wait(settings.task_events_reconnect_interval)
+
+
+broker = TaskEventBroker()
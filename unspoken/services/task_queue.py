@@ -1,36 +1,309 @@
-import queue
+import os
+import socket
+import datetime
+import functools
 import threading
+import dataclasses
 from typing import Callable
 
 import logging
 
+from unspoken.core.readiness import add_readiness_check
+from unspoken.enitites.enums.job_status import JobStatus
+from unspoken.enitites.enums.scheduler_policy import SchedulerPolicy
+from unspoken.enitites.enums.transcription_model import TranscriptionModel
+from unspoken.exceptions import TaskCancelledError
+from unspoken.services import db
+from unspoken.services.staged_executor import StagedExecutor
+from unspoken.settings import settings
+
 logger = logging.getLogger('uvicorn')
 
-task_queue = queue.Queue()
+_stop_event = threading.Event()
+
+
+class _LeaseKeeper(threading.Thread):
+    """Renews leases of the jobs held by a worker until they are released."""
+
+    def __init__(self, worker_id: str):
+        super().__init__(name=f'lease-keeper-{worker_id}', daemon=True)
+        self._worker_id = worker_id
+        self._job_ids: set[int] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def hold(self, job_id: int) -> None:
+        with self._lock:
+            self._job_ids.add(job_id)
+
+    def release(self, job_id: int) -> None:
+        with self._lock:
+            self._job_ids.discard(job_id)
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def run(self) -> None:
+        while not self._stopped.wait(settings.queue_heartbeat_interval):
+            with self._lock:
+                job_ids = list(self._job_ids)
+            if not job_ids:
+                continue
+            try:
+                renewed = db.renew_job_leases(job_ids, self._worker_id, settings.queue_lease_seconds)
+            except Exception:
+                logger.exception('Unable to renew job leases for worker %s', self._worker_id)
+                continue
+            for job_id in set(job_ids) - set(renewed):
+                logger.warning('Worker %s lost lease of job %s', self._worker_id, job_id)
+
+
+def _make_worker_id() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
 
+def _worker_max_duration(worker_index: int) -> float | None:
+    """Workers reserved for the short lane only take short jobs, at least one worker is left for the rest."""
+    if settings.scheduler_policy != SchedulerPolicy.lanes:
+        return None
+    reserved = min(settings.short_lane_workers, _worker_count() - 1)
+    return settings.short_task_max_duration if worker_index < reserved else None
 
-def worker(process_func: Callable):
-    while True:
-        task = task_queue.get()
-        if task is None:
-            break
+
+def _claim_job(
+    worker_id: str,
+    max_duration: float | None = None,
+    resident_models: Callable[[], list[TranscriptionModel]] | None = None,
+) -> db.Job | None:
+    for job in db.fail_exhausted_jobs(settings.queue_max_attempts):
+        logger.error('Job %s for task %s failed after %s attempts', job.id, job.task_id, job.attempts)
+        temp_file = db.get_temp_file(job.temp_file_id)
+        if temp_file:
+            temp_file.delete()
+    return db.claim_job(
+        worker_id,
+        settings.queue_lease_seconds,
+        policy=settings.scheduler_policy,
+        max_duration=max_duration,
+        preferred_models=resident_models() if resident_models else None,
+        preference_max_wait=settings.resident_model_max_wait,
+    )
+
+
+def _job_status(error: BaseException | None) -> JobStatus:
+    if error is None:
+        return JobStatus.completed
+    if isinstance(error, TaskCancelledError):
+        return JobStatus.cancelled
+    return JobStatus.failed
+
+
+def _finish_job(job: db.Job, worker_id: str, lease_keeper: _LeaseKeeper, error: BaseException | None) -> None:
+    try:
+        db.finish_job(job.id, worker_id, _job_status(error))
+    except Exception:
+        logger.exception('Unable to finish job %s', job.id)
+    finally:
+        lease_keeper.release(job.id)
+
+
+def _run_sequential(
+    process_func: Callable,
+    claim: Callable[[], db.Job | None],
+    worker_id: str,
+    lease_keeper: _LeaseKeeper,
+    stop_event,
+) -> None:
+    while not stop_event.is_set():
         try:
-            process_func(*task)
+            job = claim()
+        except Exception as e:
+            logger.exception(f'Error claiming task: {e}')
+            stop_event.wait(settings.queue_poll_interval)
+            continue
+        if job is None:
+            stop_event.wait(settings.queue_poll_interval)
+            continue
+        lease_keeper.hold(job.id)
+        error = None
+        try:
+            process_func(job.temp_file_id, job.task_id)
+        except TaskCancelledError as e:
+            logger.info('Task %s was cancelled', job.task_id)
+            error = e
         except Exception as e:
             logger.exception(f'Error processing task: {e}')
+            error = e
         finally:
-            task_queue.task_done()
+            _finish_job(job, worker_id, lease_keeper, error)
+
 
+def _run_staged(
+    executor: StagedExecutor,
+    claim: Callable[[], db.Job | None],
+    worker_id: str,
+    lease_keeper: _LeaseKeeper,
+    stop_event,
+) -> None:
+    executor.start()
+    try:
+        while not stop_event.is_set():
+            if not executor.acquire(timeout=settings.queue_poll_interval):
+                continue
+            try:
+                job = claim()
+            except Exception as e:
+                logger.exception(f'Error claiming task: {e}')
+                job = None
+            if job is None:
+                executor.release()
+                stop_event.wait(settings.queue_poll_interval)
+                continue
+            lease_keeper.hold(job.id)
+            executor.submit(
+                job.temp_file_id,
+                job.task_id,
+                callback=functools.partial(_finish_job, job, worker_id, lease_keeper),
+            )
+    finally:
+        executor.stop()
 
-def start_worker(process_func: Callable):
-    thread = threading.Thread(target=worker, args=(process_func,))
+
+def worker(
+    process_func: Callable | StagedExecutor,
+    stop_event: threading.Event = _stop_event,
+    worker_index: int = 0,
+    warm_up: Callable[[], None] | None = None,
+    ready_event: threading.Event | None = None,
+    resident_models: Callable[[], list[TranscriptionModel]] | None = None,
+):
+    """
+    Claim and process jobs until ``stop_event`` is set.
+
+    :param warm_up: Called once before the first job is claimed, e.g. to load the models.
+    :param ready_event: Set once the warm up finished and the worker starts claiming jobs.
+    :param resident_models: Returns the models loaded by the worker, their jobs are claimed first.
+    """
+    if warm_up:
+        warm_up()
+    if ready_event is not None:
+        ready_event.set()
+    worker_id = _make_worker_id()
+    lease_keeper = _LeaseKeeper(worker_id)
+    lease_keeper.start()
+    max_duration = _worker_max_duration(worker_index)
+    claim = functools.partial(_claim_job, worker_id, max_duration, resident_models)
+    if max_duration is not None:
+        logger.info('Worker %s started in the short lane, max duration %s', worker_id, max_duration)
+    else:
+        logger.info('Worker %s started', worker_id)
+    try:
+        if isinstance(process_func, StagedExecutor):
+            _run_staged(process_func, claim, worker_id, lease_keeper, stop_event)
+        else:
+            _run_sequential(process_func, claim, worker_id, lease_keeper, stop_event)
+    finally:
+        lease_keeper.stop()
+        logger.info('Worker %s stopped', worker_id)
+
+
+def start_worker(
+    process_func: Callable | StagedExecutor,
+    warm_up: Callable[[], None] | None = None,
+    resident_models: Callable[[], list[TranscriptionModel]] | None = None,
+):
+    _stop_event.clear()
+    ready_event = threading.Event()
+    add_readiness_check(ready_event.is_set)
+    thread = threading.Thread(
+        target=worker,
+        args=(process_func,),
+        kwargs={'warm_up': warm_up, 'ready_event': ready_event, 'resident_models': resident_models},
+    )
     thread.start()
     return thread
 
 
 def stop_worker():
-    task_queue.put(None)
+    _stop_event.set()
+
+
+def add_task(
+    temp_file_id: int,
+    task_id: int,
+    size: int | None = None,
+    duration: float | None = None,
+    model: TranscriptionModel | None = None,
+):
+    db.enqueue_job(task_id=task_id, temp_file_id=temp_file_id, size=size, duration=duration, model=model)
+
+
+@dataclasses.dataclass
+class QueueLoad:
+    depth: int
+    size: int
+
+
+@dataclasses.dataclass
+class QueueEstimate:
+    position: int | None = None
+    eta_seconds: float | None = None
+
+
+def get_queue_load() -> QueueLoad:
+    """Number of queued jobs and bytes held on the temp volume by queued, running and uploading files."""
+    jobs = db.get_active_jobs()
+    return QueueLoad(
+        depth=sum(1 for job in jobs if job.status == JobStatus.queued),
+        size=sum(job.size or 0 for job in jobs) + db.get_upload_sessions_size(),
+    )
+
+
+def is_queue_full(incoming_size: int = 0) -> bool:
+    if not settings.max_queue_depth and not settings.max_queued_bytes:
+        return False
+    load = get_queue_load()
+    if settings.max_queue_depth and load.depth >= settings.max_queue_depth:
+        return True
+    if settings.max_queued_bytes and load.size + incoming_size > settings.max_queued_bytes:
+        return True
+    return False
+
+
+def _worker_count() -> int:
+    return max(1, len(settings.worker_devices) or settings.cpu_workers)
+
+
+def estimate_task(task_id: int) -> QueueEstimate:
+    """
+    Estimate the queue position and remaining time of a task.
+
+    The remaining processing time of every job is its audio duration times the average real-time factor
+    of recently completed tasks, the work in front of the task is shared between the workers.
+    """
+    jobs = db.get_active_jobs(settings.scheduler_policy)
+    position = next((position for position, job in enumerate(jobs) if job.task_id == task_id), None)
+    if position is None:
+        return QueueEstimate()
+    job = jobs[position]
+
+    real_time_factor = db.get_recent_real_time_factor(settings.eta_history_size) or settings.default_real_time_factor
+    known_durations = [j.duration for j in jobs if j.duration]
+    default_duration = sum(known_durations) / len(known_durations) if known_durations else 0.0
+    now = datetime.datetime.utcnow()
+
+    def remaining(j) -> float:
+        total = (j.duration or default_duration) * real_time_factor
+        if j.status == JobStatus.running and j.started_at:
+            return max(0.0, total - (now - j.started_at).total_seconds())
+        return total
 
+    if job.status == JobStatus.running:
+        return QueueEstimate(position=0, eta_seconds=remaining(job))
 
-def add_task(*args):
-    task_queue.put(args)
+    ahead = jobs[:position]
+    work_ahead = sum(remaining(j) for j in ahead)
+    return QueueEstimate(
+        position=sum(1 for j in ahead if j.status == JobStatus.queued) + 1,
+        eta_seconds=work_ahead / _worker_count() + remaining(job),
+    )
@@ -0,0 +1,160 @@
+import os
+import logging
+import threading
+import dataclasses
+import multiprocessing
+from typing import Callable
+
+from unspoken.core.device import configure_torch_threads
+from unspoken.core.readiness import add_readiness_check
+from unspoken.enitites.enums.transcription_model import TranscriptionModel
+from unspoken.services import task_queue
+from unspoken.services.staged_executor import StagedExecutor
+from unspoken.settings import settings
+
+logger = logging.getLogger('uvicorn')
+
+
+@dataclasses.dataclass(frozen=True)
+class WorkerSpec:
+    index: int
+    device: str
+    device_index: int
+    cpu_threads: int
+
+
+def _parse_device(device: str) -> tuple[str, int]:
+    name, _, index = device.partition(':')
+    return name, int(index) if index else 0
+
+
+def get_worker_specs() -> list[WorkerSpec]:
+    """
+    Build worker specs from settings.
+
+    ``worker_devices`` takes precedence and starts one worker per listed device (``cuda:0``, ``cuda:1``, ``cpu``).
+    Otherwise ``cpu_workers`` starts that many CPU workers which split the available cores between them.
+    An empty list means the pool is disabled and a single in-process worker is used.
+    """
+    if settings.worker_devices:
+        devices = [_parse_device(device) for device in settings.worker_devices]
+        cpu_workers = sum(1 for name, _ in devices if name == 'cpu')
+        cpu_threads = max(1, (os.cpu_count() or 1) // cpu_workers) if cpu_workers else 0
+        return [
+            WorkerSpec(
+                index=index,
+                device=name,
+                device_index=device_index,
+                cpu_threads=cpu_threads if name == 'cpu' else settings.cpu_threads,
+            )
+            for index, (name, device_index) in enumerate(devices)
+        ]
+    if settings.cpu_workers > 0:
+        cpu_threads = max(1, (os.cpu_count() or 1) // settings.cpu_workers)
+        return [
+            WorkerSpec(index=index, device='cpu', device_index=0, cpu_threads=cpu_threads)
+            for index in range(settings.cpu_workers)
+        ]
+    return []
+
+
+def _run_worker(
+    spec: WorkerSpec,
+    process_func: Callable | StagedExecutor,
+    stop_event,
+    warm_up: Callable[[], None] | None = None,
+    ready_event=None,
+    resident_models: Callable[[], list[TranscriptionModel]] | None = None,
+) -> None:
+    logging.basicConfig(level=logging.INFO)
+    settings.device = spec.device
+    settings.device_index = spec.device_index
+    settings.cpu_threads = spec.cpu_threads
+    configure_torch_threads()
+    logger.info('Worker %s started on %s:%s', spec.index, spec.device, spec.device_index)
+    task_queue.worker(
+        process_func,
+        stop_event,
+        worker_index=spec.index,
+        warm_up=warm_up,
+        ready_event=ready_event,
+        resident_models=resident_models,
+    )
+
+
+class WorkerPool:
+    """
+    Runs one worker process per spec.
+
+    Every process owns its own models and claims jobs from the shared queue, so an idle worker picks up
+    the next job as soon as it is free. Processes that die are restarted, their jobs are reclaimed
+    once the lease expires. The pool is ready once every process has warmed up its models.
+    """
+
+    def __init__(
+        self,
+        process_func: Callable | StagedExecutor,
+        specs: list[WorkerSpec],
+        warm_up: Callable[[], None] | None = None,
+        resident_models: Callable[[], list[TranscriptionModel]] | None = None,
+    ):
+        self._process_func = process_func
+        self._specs = specs
+        self._warm_up = warm_up
+        self._resident_models = resident_models
+        self._context = multiprocessing.get_context('spawn')
+        self._stop_event = self._context.Event()
+        self._ready_events = {spec.index: self._context.Event() for spec in specs}
+        self._processes: dict[int, multiprocessing.Process] = {}
+        self._supervisor: threading.Thread | None = None
+
+    def _spawn(self, spec: WorkerSpec) -> None:
+        ready_event = self._ready_events[spec.index]
+        ready_event.clear()
+        process = self._context.Process(
+            target=_run_worker,
+            args=(spec, self._process_func, self._stop_event, self._warm_up, ready_event, self._resident_models),
+            name=f'unspoken-worker-{spec.index}',
+        )
+        process.start()
+        self._processes[spec.index] = process
+
+    def _supervise(self) -> None:
+        while not self._stop_event.wait(settings.worker_restart_interval):
+            for spec in self._specs:
+                process = self._processes[spec.index]
+                if not process.is_alive():
+                    self._ready_events[spec.index].clear()
+                    logger.warning('Worker %s exited with code %s, restarting', spec.index, process.exitcode)
+                    self._spawn(spec)
+
+    def is_ready(self) -> bool:
+        return all(event.is_set() for event in self._ready_events.values())
+
+    def start(self) -> None:
+        logger.info('Starting %s workers', len(self._specs))
+        for spec in self._specs:
+            self._spawn(spec)
+        self._supervisor = threading.Thread(target=self._supervise, name='worker-pool-supervisor', daemon=True)
+        self._supervisor.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def join(self) -> None:
+        if self._supervisor:
+            self._supervisor.join()
+        for process in self._processes.values():
+            process.join()
+
+
+def start_worker_pool(
+    process_func: Callable | StagedExecutor,
+    specs: list[WorkerSpec],
+    warm_up: Callable[[], None] | None = None,
+    resident_models: Callable[[], list[TranscriptionModel]] | None = None,
+) -> WorkerPool:
+    pool = WorkerPool(process_func, specs, warm_up, resident_models)
+    add_readiness_check(pool.is_ready)
+    pool.start()
+    return pool
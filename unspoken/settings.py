@@ -1,11 +1,44 @@
 from pydantic_settings import BaseSettings
 
+from unspoken.enitites.enums.annotation_strategy import AnnotationStrategy
+from unspoken.enitites.enums.scheduler_policy import SchedulerPolicy
+from unspoken.enitites.enums.transcription_mode import TranscriptionMode
+from unspoken.enitites.enums.transcription_model import TranscriptionModel
+
 
 class _Settings(BaseSettings):
     # WHISPER SETTINGS
     device: str = 'cuda'
     device_index: int = 0
     compute_type: str = 'auto'
+    cpu_compute_type: str = 'int8'
+    cpu_threads: int = 0
+    cpu_interop_threads: int = 1
+    transcription_model: TranscriptionModel = TranscriptionModel.large_v3
+    transcription_models: list[TranscriptionModel] = [TranscriptionModel.large_v3]
+    transcription_mode: TranscriptionMode = TranscriptionMode.sequential
+    transcription_batch_size: int = 8
+    turn_max_duration: float = 30.0
+    turn_max_gap: float = 1.0
+    turn_workers: int = 2
+
+    # VAD SETTINGS
+    vad_prefilter: bool = False
+    vad_min_silence: float = 2.0
+    vad_speech_pad: float = 0.4
+
+    # DIARIZATION SETTINGS
+    diarization_window: float = 0
+    diarization_window_overlap: float = 60
+    diarization_speaker_similarity: float = 0.6
+    diarization_single_speaker_check: bool = True
+
+    # MODEL REGISTRY SETTINGS
+    models_memory_budget: int = 0
+
+    # ANNOTATION SETTINGS
+    annotation_strategy: AnnotationStrategy = AnnotationStrategy.dtw
+    annotation_dtw_band: float = 0.0
 
     # HUGGINGFACE SETTINGS
     hf_token: str
@@ -26,6 +59,62 @@ class _Settings(BaseSettings):
     transcribe_audio_queue: str = 'transcribe_audio'
     transcribe_audio_routing_key: str = 'transcribe.#'
 
+    # UPLOAD SETTINGS
+    upload_chunk_size: int = 1024 * 1024
+    max_upload_size: int = 4 * 1024 * 1024 * 1024
+    upload_session_ttl: int = 24 * 60 * 60
+    upload_session_gc_interval: int = 10 * 60
+
+    # QUEUE SETTINGS
+    queue_lease_seconds: int = 60
+    queue_heartbeat_interval: int = 15
+    queue_poll_interval: float = 2.0
+    queue_max_attempts: int = 3
+
+    # SCHEDULER SETTINGS
+    scheduler_policy: SchedulerPolicy = SchedulerPolicy.fifo
+    scheduler_aging_rate: float = 10.0
+    short_task_max_duration: float = 5 * 60
+    short_lane_workers: int = 1
+    resident_model_max_wait: float = 60.0
+
+    # ADMISSION SETTINGS
+    max_queue_depth: int = 0
+    max_queued_bytes: int = 0
+    admission_retry_after: int = 60
+    eta_history_size: int = 20
+    default_real_time_factor: float = 0.5
+
+    # WORKER POOL SETTINGS
+    worker_devices: list[str] = []
+    cpu_workers: int = 0
+    worker_restart_interval: float = 5.0
+
+    # PIPELINE SETTINGS
+    pipeline_enabled: bool = False
+    pipeline_queue_size: int = 1
+    pipeline_prepare_workers: int = 1
+    pipeline_finalize_workers: int = 1
+    cancel_check_interval: float = 5.0
+    partial_flush_segments: int = 20
+    partial_flush_interval: float = 10.0
+
+    # DECODER SETTINGS
+    decode_read_size: int = 1024 * 1024
+    decode_memmap_threshold: int = 512 * 1024 * 1024
+
+    # LIVE SETTINGS
+    live_enabled: bool = False
+    live_step: float = 0.5
+    live_interim_interval: float = 1.0
+    live_silence_duration: float = 0.8
+    live_max_buffer: float = 20.0
+    live_min_speaker_audio: float = 1.0
+
+    # TASK EVENTS SETTINGS
+    task_events_keepalive_interval: float = 15.0
+    task_events_reconnect_interval: float = 5.0
+
     # OTHER SETTINGS
     temp_files_dir: str = 'temp_files'
     alembic_ini_path: str = 'alembic.ini'